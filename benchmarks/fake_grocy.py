@@ -0,0 +1,260 @@
+'''Local stand-in grocy server for the benchmarks
+
+Serves a synthesized catalog over the grocy REST api subset the integration uses
+(objects, userfields, shopping list add/remove, db-changed-time) and counts the
+requests and the request/response body bytes it sees (headers are not counted).
+GET /__stats returns the counters, POST /__reset clears them.
+
+Usage: python benchmarks/fake_grocy.py [products] [port]
+'''
+
+import json
+import re
+import sys
+import threading
+
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Pipe, Process
+from urllib.parse import urlparse, parse_qsl
+
+DEFAULT_PRODUCTS = 1000
+DEFAULT_SHOPPING_LISTS = 3
+DEFAULT_LOCATIONS = 10
+DEFAULT_QUANTITY_UNITS = 5
+
+STORES = ["rami levy", "shufersal", "my supermarket"]
+CONDITION_RE = re.compile(r'^(\w+)(!=|<=|>=|=|<|>)(.*)$')
+
+
+def synthesize(products: int, shopping_lists: int = DEFAULT_SHOPPING_LISTS, inline_userfields: bool = True):
+    '''Return the grocy tables of a catalog with the given number of products'''
+    product_groups = max(5, products // 50)
+    timestamp = "2020-03-20 10:00:00"
+    tables = {
+        'products': [],
+        'product_groups': [{"id": str(i), "name": f"Group {i}", "description": "",
+                            "row_created_timestamp": timestamp} for i in range(1, product_groups + 1)],
+        'locations': [{"id": str(i), "name": f"Location {i}", "description": "", "is_freezer": "0",
+                       "row_created_timestamp": timestamp} for i in range(1, DEFAULT_LOCATIONS + 1)],
+        'quantity_units': [{"id": str(i), "name": f"Unit {i}", "name_plural": f"Units {i}", "description": "",
+                            "row_created_timestamp": timestamp} for i in range(1, DEFAULT_QUANTITY_UNITS + 1)],
+        'shopping_lists': [{"id": str(i), "name": f"List {i}", "description": "",
+                            "row_created_timestamp": timestamp} for i in range(1, shopping_lists + 1)],
+        'shopping_list': []
+    }
+    userfields = {}
+    for id in range(1, products + 1):
+        userfields[str(id)] = {
+            "price": f"{id % 50 + 0.9:.2f}",
+            "store": STORES[id % len(STORES)],
+            "favorite": "1" if id % 10 == 0 else "0",
+            "popular": "0",
+            "metadata": json.dumps({"id": id})
+        }
+        product = {
+            "id": str(id),
+            "name": f"Product {id}",
+            "description": "",
+            "location_id": str(id % DEFAULT_LOCATIONS + 1),
+            "product_group_id": str(id % product_groups + 1),
+            "qu_id_stock": "1",
+            "qu_id_purchase": str(id % DEFAULT_QUANTITY_UNITS + 1),
+            "qu_factor_purchase_to_stock": "1.0",
+            "picture_file_name": f"{id}.jpg",
+            "allow_partial_units_in_stock": "0",
+            "min_stock_amount": "0",
+            "default_best_before_days": "0",
+            "barcode": f"729{id:010d}",
+            "row_created_timestamp": timestamp
+        }
+        if inline_userfields:
+            product["userfields"] = userfields[str(id)]
+        tables['products'].append(product)
+    # A fifth of the products are on a list
+    for id in range(1, products // 5 + 1):
+        tables['shopping_list'].append({
+            "id": str(id),
+            "product_id": str(id * 5),
+            "note": None,
+            "amount": str(id % 3 + 1),
+            "shopping_list_id": str(id % shopping_lists + 1),
+            "done": "0",
+            "row_created_timestamp": timestamp
+        })
+    return tables, userfields
+
+
+def _matches(row, condition) -> bool:
+    match = CONDITION_RE.match(condition)
+    if match is None or match.group(1) not in row:
+        return True
+    field, op, value = match.groups()
+    left, right = row[field], value
+    try:
+        left, right = float(left), float(right)
+    except (TypeError, ValueError):
+        left, right = str(left), str(right)
+    return {'=': left == right, '!=': left != right, '<': left < right,
+            '>': left > right, '<=': left <= right, '>=': left >= right}[op]
+
+
+class FakeGrocy:
+    '''The grocy state and request counters'''
+
+    def __init__(self, products: int, inline_userfields: bool = True):
+        self.tables, self.userfields = synthesize(products, inline_userfields=inline_userfields)
+        self.changed = datetime(2020, 3, 20, 10, 0, 0)
+        self.requests = 0
+        self.body_bytes_in = 0
+        self.body_bytes_out = 0
+        self.lock = threading.Lock()
+        self._next_item_id = len(self.tables['shopping_list']) + 1
+        # Serialized full tables, dropped on writes
+        self._encoded = {}
+
+    def stats(self):
+        return {'requests': self.requests, 'body_bytes_in': self.body_bytes_in,
+                'body_bytes_out': self.body_bytes_out}
+
+    def reset(self):
+        with self.lock:
+            self.requests = self.body_bytes_in = self.body_bytes_out = 0
+
+    def count(self, body_bytes_in: int, body_bytes_out: int):
+        with self.lock:
+            self.requests += 1
+            self.body_bytes_in += body_bytes_in
+            self.body_bytes_out += body_bytes_out
+
+    def get_objects(self, entity: str, params):
+        conditions = [value for key, value in params if key == 'query[]']
+        options = dict(params)
+        if not conditions and 'limit' not in options and 'order' not in options:
+            with self.lock:
+                encoded = self._encoded.get(entity)
+                if encoded is None:
+                    encoded = self._encoded[entity] = json.dumps(self.tables[entity]).encode()
+            return encoded
+        rows = [row for row in self.tables[entity] if all(_matches(row, c) for c in conditions)]
+        if 'order' in options:
+            field, _, direction = options['order'].partition(':')
+            rows.sort(key=lambda row: float(row[field]) if str(row[field]).replace('.', '', 1).isdigit()
+                      else str(row[field]), reverse=direction == 'desc')
+        if 'limit' in options:
+            offset = int(options.get('offset', 0))
+            rows = rows[offset:offset + int(options['limit'])]
+        return json.dumps(rows).encode()
+
+    def change_shopping_list(self, product_id: str, shopping_list_id: str, amount: float):
+        with self.lock:
+            items = self.tables['shopping_list']
+            item = next((item for item in items if item['product_id'] == product_id and
+                         item['shopping_list_id'] == shopping_list_id), None)
+            if item is None and amount > 0:
+                items.append({"id": str(self._next_item_id), "product_id": product_id, "note": None,
+                              "amount": str(amount), "shopping_list_id": shopping_list_id, "done": "0",
+                              "row_created_timestamp": self.changed.strftime('%Y-%m-%d %H:%M:%S')})
+                self._next_item_id += 1
+            elif item is not None:
+                new_amount = float(item['amount']) + amount
+                if new_amount > 0:
+                    item['amount'] = str(new_amount)
+                else:
+                    items.remove(item)
+            self._encoded.pop('shopping_list', None)
+            self.changed += timedelta(seconds=1)
+
+
+def make_handler(grocy: FakeGrocy):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes, don't let keep-alive connections wait on delayed acks
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: bytes = b'', count: bool = True, body_bytes_in: int = 0):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            if count:
+                grocy.count(body_bytes_in, len(body))
+
+        def _read_body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b''
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = url.path
+            params = parse_qsl(url.query)
+            if path == '/__stats':
+                return self._reply(200, json.dumps(grocy.stats()).encode(), count=False)
+            if path == '/api/system/db-changed-time':
+                return self._reply(200, json.dumps(
+                    {"changed_time": grocy.changed.strftime('%Y-%m-%d %H:%M:%S')}).encode())
+            if path == '/api/system/info':
+                return self._reply(200, json.dumps({"grocy_version": {"Version": "2.7.1"}}).encode())
+            if path.startswith('/api/objects/'):
+                entity = path[len('/api/objects/'):]
+                if entity in grocy.tables:
+                    return self._reply(200, grocy.get_objects(entity, params))
+            if path.startswith('/api/userfields/products/'):
+                values = grocy.userfields.get(path.rsplit('/', 1)[1])
+                if values is not None:
+                    return self._reply(200, json.dumps(values).encode())
+            if path.startswith('/api/stock/products/by-barcode/'):
+                barcode = path.rsplit('/', 1)[1]
+                product = next((product for product in grocy.tables['products']
+                                if product['barcode'] == barcode), None)
+                if product is not None:
+                    return self._reply(200, json.dumps({"product": product}).encode())
+            self._reply(404)
+
+        def do_POST(self):
+            body = self._read_body()
+            if self.path == '/__reset':
+                grocy.reset()
+                return self._reply(204, count=False)
+            form = dict(parse_qsl(body.decode()))
+            if self.path in ('/api/stock/shoppinglist/add-product', '/api/stock/shoppinglist/remove-product'):
+                sign = 1 if self.path.endswith('add-product') else -1
+                grocy.change_shopping_list(form.get('product_id'), form.get('list_id', '1'),
+                                           sign * float(form.get('product_amount', 1)))
+                return self._reply(204, body_bytes_in=len(body))
+            self._reply(404, body_bytes_in=len(body))
+
+        def do_PUT(self):
+            body = self._read_body()
+            self._reply(204, body_bytes_in=len(body))
+
+    return Handler
+
+
+def serve(products: int, port: int = 0, inline_userfields: bool = True, ready = None):
+    '''Run the server (blocking), ready (a Pipe end) receives the port once it listens'''
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(FakeGrocy(products, inline_userfields)))
+    server.daemon_threads = True
+    if ready is not None:
+        ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def start(products: int, inline_userfields: bool = True):
+    '''Start the server in another process (so it doesn't count in the peak memory), return (process, port)'''
+    parent, child = Pipe()
+    process = Process(target=serve, args=(products, 0, inline_userfields, child), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+if __name__ == '__main__':
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PRODUCTS
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9192
+    print(f"Fake grocy with {products} products on http://127.0.0.1:{port}/api/")
+    serve(products, port)
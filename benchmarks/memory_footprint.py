@@ -0,0 +1,115 @@
+'''Per object memory footprint of the grocy model classes
+
+The slot based models are compared with __dict__ based references, the way the
+models were defined before they declared __slots__.
+
+Usage: python benchmarks/memory_footprint.py [products]
+'''
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'custom_components', 'grocy'))
+
+from grocy.grocy_api_client import ProductData, ShoppingListItem
+from grocy.utils import parse_date, parse_int, parse_float
+
+DEFAULT_PRODUCTS = 10000
+
+
+class DictShoppingListItem(object):
+    '''ShoppingListItem before __slots__ (per instance __dict__)'''
+
+    def __init__(self, parsed_json):
+        self._id = parse_int(parsed_json.get('id'))
+        self._product_id = parse_int(parsed_json.get('product_id', None))
+        self._note = parsed_json.get('note',None)
+        self._amount = parse_float(parsed_json.get('amount'),0)
+        self._row_created_timestamp = parse_date(parsed_json.get('row_created_timestamp', None))
+        self._shopping_list_id = parse_int(parsed_json.get('shopping_list_id'))
+        self._done = parse_int(parsed_json.get('done'))
+
+
+class DictProductData(object):
+    '''ProductData before __slots__ (per instance __dict__, barcodes as a list)'''
+
+    def __init__(self, parsed_json):
+        self._id = parse_int(parsed_json.get('id'))
+        self._name = parsed_json.get('name')
+        self._description = parsed_json.get('description')
+        self._row_created_timestamp = parse_date(parsed_json.get('row_created_timestamp', None))
+        self._location_id = parse_int(parsed_json.get('location_id', None))
+        self._product_group_id = parse_int(parsed_json.get('product_group_id', None))
+        self._qu_id_stock = parse_int(parsed_json.get('qu_id_stock', None))
+        self._qu_id_purchase = parse_int(parsed_json.get('qu_id_purchase', None))
+        self._qu_factor_purchase_to_stock = parse_float(parsed_json.get('qu_factor_purchase_to_stock', None))
+        self._picture_file_name = parsed_json.get('picture_file_name', None)
+        self._allow_partial_units_in_stock = bool(parsed_json.get('allow_partial_units_in_stock', None) == "true")
+        self._min_stock_amount = parse_int(parsed_json.get('min_stock_amount', None), 0)
+        self._default_best_before_days = parse_int(parsed_json.get('default_best_before_days', None))
+        self._userfields = parsed_json.get('userfields') or {}
+        self._price = parse_float(self._userfields.get('price'))
+        barcodes_raw = parsed_json.get('barcode', "")
+        self._barcodes = None if barcodes_raw is None else barcodes_raw.split(",")
+
+
+def product_json(id):
+    return {
+        "id": str(id),
+        "name": f"Product {id}",
+        "description": "",
+        "location_id": str(id % 5 + 1),
+        "product_group_id": str(id % 20 + 1),
+        "qu_id_stock": "1",
+        "qu_id_purchase": "1",
+        "qu_factor_purchase_to_stock": "1.0",
+        "picture_file_name": f"{id}.jpg",
+        "allow_partial_units_in_stock": "0",
+        "min_stock_amount": "0",
+        "default_best_before_days": "0",
+        "barcode": f"729{id:010d}",
+        "row_created_timestamp": "2020-03-20 10:00:00",
+        "userfields": {"price": "9.90", "store": "rami levy", "favorite": "0", "popular": "0", "metadata": ""}
+    }
+
+
+def shopping_list_item_json(id):
+    return {
+        "id": str(id),
+        "product_id": str(id),
+        "note": None,
+        "amount": "1",
+        "shopping_list_id": "1",
+        "done": "0",
+        "row_created_timestamp": "2020-03-20 10:00:00"
+    }
+
+
+def measure(factory, count):
+    '''Return the bytes allocated per object created by factory'''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return allocated / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PRODUCTS
+    products_json = [product_json(i) for i in range(count)]
+    items_json = [shopping_list_item_json(i) for i in range(count)]
+    print(f"products: {count}")
+    for name, before, after, objects_json in [('ProductData', DictProductData, ProductData, products_json),
+                                              ('ShoppingListItem', DictShoppingListItem, ShoppingListItem, items_json)]:
+        before_size = measure(lambda i: before(objects_json[i]), count)
+        after_size = measure(lambda i: after(objects_json[i]), count)
+        print(f"{name}: {before_size:.0f} -> {after_size:.0f} bytes/object, "
+              f"{before_size * count / 1024 / 1024:.2f} -> {after_size * count / 1024 / 1024:.2f} MiB total")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+'''End to end refresh benchmark against the local fake grocy server
+
+Runs each scenario (cold start, forced sync, single add_to_list) for every catalog
+size, through the grocy clients and, when home assistant is installed, through
+Data.async_update_data. Reports wall time, requests, body bytes (HTTP headers
+not included) and peak memory.
+Times come from a run without tracemalloc, peak memory from a second run with it.
+
+Usage: python benchmarks/refresh_benchmark.py [--sizes 100,1000,5000] [--legacy] [--repeat N]
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from urllib.request import Request, urlopen
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..', 'custom_components', 'grocy'))
+
+from grocy.grocy import Grocy, AsyncGrocy
+
+import fake_grocy
+
+DEFAULT_SIZES = [100, 1000, 5000]
+API_KEY = 'benchmark'
+
+
+class FakeGrocyServer:
+    '''The fake grocy process and its request counters'''
+
+    def __init__(self, products: int, inline_userfields: bool = True):
+        self._process, self.port = fake_grocy.start(products, inline_userfields)
+        self.base_url = 'http://127.0.0.1'
+
+    def _call(self, method: str, path: str):
+        request = Request(f"{self.base_url}:{self.port}{path}", method=method)
+        with urlopen(request) as response:
+            return response.read()
+
+    def reset(self):
+        self._call('POST', '/__reset')
+
+    def stats(self):
+        return json.loads(self._call('GET', '/__stats'))
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+
+class BenchmarkHass:
+    '''The parts of hass Data uses'''
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.data = {}
+
+    def async_create_task(self, coro):
+        return self.loop.create_task(coro)
+
+
+class NoSnapshot:
+    def async_schedule_save(self, domain_data):
+        pass
+
+
+def load_data_class():
+    '''Return (Data, setup_domain_data) if home assistant is installed, else None'''
+    sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+    try:
+        from custom_components.grocy import Data, Entities
+        from custom_components.grocy.grocy import AsyncGrocy as ComponentAsyncGrocy
+        from custom_components.grocy.catalog import Catalog
+        from custom_components.grocy.const import (DOMAIN_DATA, DATA_CATALOG, DATA_ENTITIES, DATA_SNAPSHOT,
+                                                   PRODUCTS_NAME, SHOPPING_LIST_NAME, SHOPPING_LISTS_NAME,
+                                                   LOCATIONS_NAME, QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME)
+    except ImportError as e:
+        print(f"Skipping the Data scenarios, home assistant is not installed ({e})")
+        return None
+
+    def create(server):
+        hass = BenchmarkHass(asyncio.get_event_loop())
+        hass.data[DOMAIN_DATA] = {
+            PRODUCTS_NAME: None, SHOPPING_LIST_NAME: None, SHOPPING_LISTS_NAME: None,
+            LOCATIONS_NAME: None, QUANTITY_UNITS_NAME: None, PRODUCT_GROUPS_NAME: None,
+            DATA_CATALOG: Catalog(),
+            DATA_ENTITIES: Entities(hass),
+            DATA_SNAPSHOT: NoSnapshot()
+        }
+        client = ComponentAsyncGrocy(server.base_url, API_KEY, server.port)
+        return Data(hass, client, coalesce_delay=0), client
+
+    return create
+
+
+async def fetch_all(client):
+    await asyncio.gather(client.get_products(True), client.shopping_list(), client.shopping_lists(),
+                         client.locations(), client.quantity_units(), client.product_groups())
+
+
+def client_scenarios(server):
+    '''(name, setup, run, teardown), setup returns the state run and teardown get'''
+
+    async def new_client():
+        return AsyncGrocy(server.base_url, API_KEY, server.port)
+
+    async def warm_client():
+        client = await new_client()
+        await fetch_all(client)
+        return client
+
+    async def close(client):
+        await client.close()
+
+    async def add_to_list(client):
+        await client.add_product_to_shopping_list(1, 1, 1)
+        # Without local apply the list has to be fetched again
+        await client.shopping_list(1)
+
+    async def sync_setup():
+        return Grocy(server.base_url, API_KEY, server.port)
+
+    def sync_fetch_all(client):
+        client.get_products(True)
+        client.shopping_list()
+        client.shopping_lists()
+        client.locations()
+        client.quantity_units()
+        client.product_groups()
+
+    async def sync_cold_start(client):
+        await asyncio.get_event_loop().run_in_executor(None, sync_fetch_all, client)
+
+    async def nothing(client):
+        pass
+
+    return [
+        ('AsyncGrocy cold start', new_client, fetch_all, close),
+        ('AsyncGrocy forced sync', warm_client, fetch_all, close),
+        ('AsyncGrocy add_to_list', warm_client, add_to_list, close),
+        ('Grocy cold start', sync_setup, sync_cold_start, nothing)
+    ]
+
+
+def data_scenarios(server, create_data):
+
+    async def new_data():
+        return create_data(server)
+
+    async def warm_data():
+        data, client = create_data(server)
+        await data.async_update_data(userfields=True)
+        return data, client
+
+    async def cold_start(state):
+        data, _ = state
+        await data.async_update_data(userfields=True)
+
+    async def forced_sync(state):
+        data, _ = state
+        await data.async_update_data(force=True, userfields=True)
+
+    async def add_to_list(state):
+        data, client = state
+        # What the service does: write, apply locally, then the scheduler refresh
+        await client.add_product_to_shopping_list(1, 1, 1)
+        data.async_apply_shopping_list_deltas([(1, 1, 1)])
+        await data.async_update_data()
+
+    async def close(state):
+        await state[1].close()
+
+    return [
+        ('Data cold start', new_data, cold_start, close),
+        ('Data forced sync', warm_data, forced_sync, close),
+        ('Data add_to_list', warm_data, add_to_list, close)
+    ]
+
+
+async def measure(server, setup, run, teardown, trace: bool):
+    '''Run a scenario once, return (seconds, stats, peak bytes)'''
+    state = await setup()
+    server.reset()
+    peak = 0
+    try:
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        await run(state)
+        elapsed = time.perf_counter() - start
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        await teardown(state)
+    return elapsed, server.stats(), peak
+
+
+async def run_size(size: int, legacy: bool, repeat: int, create_data):
+    server = FakeGrocyServer(size, inline_userfields=not legacy)
+    try:
+        scenarios = client_scenarios(server)
+        if create_data:
+            scenarios += data_scenarios(server, create_data)
+        for name, setup, run, teardown in scenarios:
+            times = []
+            for _ in range(repeat):
+                elapsed, stats, _ = await measure(server, setup, run, teardown, trace=False)
+                times.append(elapsed)
+            _, _, peak = await measure(server, setup, run, teardown, trace=True)
+            print(f"{size:>7} {name:<24} {min(times) * 1000:>10.1f} {stats['requests']:>9} "
+                  f"{stats['body_bytes_out'] / 1024:>13.1f} {stats['body_bytes_in'] / 1024:>13.1f} "
+                  f"{peak / 1024 / 1024:>9.2f}")
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End to end refresh benchmark')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma separated catalog sizes (products)')
+    parser.add_argument('--legacy', action='store_true',
+                        help='grocy without inline userfields (one request per product)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per scenario (best is reported)')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    create_data = load_data_class()
+    print(f"{'size':>7} {'scenario':<24} {'wall ms':>10} {'requests':>9} "
+          f"{'body KiB recv':>13} {'body KiB sent':>13} {'peak MiB':>9}")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        for size in sizes:
+            loop.run_until_complete(run_size(size, args.legacy, args.repeat, create_data))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,33 @@
 ''' Grocy integration '''
 
+import asyncio
 import logging
 
 from homeassistant.util import Throttle
-from homeassistant.const import CONF_HOST
-
-from .grocy import Grocy
-
+from homeassistant.const import CONF_HOST, EVENT_HOMEASSISTANT_STOP
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .grocy import AsyncGrocy
+from .grocy.grocy import ShoppingListProduct
+from .grocy.transport import TransportPolicy
+from .store import BarcodeCache, StoreApiClient, close_stores
+
+from .catalog import Catalog, CatalogChanges
+from .sensor import ProductSensor, ShoppingListSensor, GrocySensor, async_update_product_sensors
+from .scheduler import ChangeScheduler
+from .snapshot import SnapshotCache
+from .write_queue import WriteQueue
+from .executor import ServiceExecutor
 from .services import setup_services
 
 from .const import (DOMAIN, DOMAIN_DATA,
-                    CONF_APIKEY, CONF_STORE,
-                    DATA_GROCY, DATA_DATA, DATA_ENTITIES, DATA_STORE_CONF,
+                    CONF_APIKEY, CONF_STORE, CONF_MAX_CONNECTIONS, CONF_HEDGE_DELAY,
+                    DATA_GROCY, DATA_DATA, DATA_ENTITIES, DATA_STORE_CONF, DATA_CATALOG,
+                    DATA_SCHEDULER, DATA_SNAPSHOT, DATA_WRITE_QUEUE, DATA_EXECUTOR,
+                    DATA_PRICE_COMPARISON,
                     PRODUCTS_NAME, SHOPPING_LISTS_NAME, SHOPPING_LIST_NAME, LOCATIONS_NAME,
-                    QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME)
+                    QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME, DEFAULT_COALESCE_DELAY)
 from .schema import CONFIG_SCHEMA
 
 _LOGGER = logging.getLogger(__name__)
@@ -34,19 +48,41 @@ async def async_setup(hass, config):
     host = "{}:{}".format(grocy_host.split(":")[0], grocy_host.split(":")[1])
     port = grocy_host.split(":")[2]
 
-    # Configure the grocy client
-    grocy = Grocy(host, grocy_apikey, port = port)
+    # Configure the grocy client, on the home assistant shared aiohttp session
+    # At most max_connections requests are in flight
+    # Requests time out, idempotent ones are retried, slow GETs are hedged when hedge_delay is set
+    policy = TransportPolicy(hedge_delay = conf.get(CONF_HEDGE_DELAY))
+    grocy = AsyncGrocy(host, grocy_apikey, port = port, session = async_get_clientsession(hass),
+                       pool_limit = conf.get(CONF_MAX_CONNECTIONS), policy = policy)
     if not grocy.is_connected():
         _LOGGER.error('Failed to connect to grocy, check apikey: ' + grocy_host)
         return None
     _LOGGER.debug('Connected to grocy: ' + grocy_host)
 
+    # Store barcode lookups are cached on disk, shared by all store clients
+    barcode_cache = BarcodeCache(hass.config.path(STORAGE_DIR, "{}.barcodes".format(DOMAIN)))
+    await hass.async_add_executor_job(barcode_cache.load)
+    StoreApiClient.set_cache(barcode_cache)
+
+    async def async_close_stores(event):
+        await hass.async_add_executor_job(barcode_cache.save)
+        await hass.async_add_executor_job(close_stores)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_stores)
+
     # Create DATA dict
+    data = Data(hass, grocy)
+    scheduler = ChangeScheduler(hass, grocy, data)
     hass.data[DOMAIN_DATA] = {
         DATA_GROCY: grocy,
-        DATA_DATA: Data(hass, grocy),
+        DATA_DATA: data,
+        DATA_SCHEDULER: scheduler,
+        DATA_WRITE_QUEUE: WriteQueue(hass, grocy, on_write=scheduler.async_notify_write),
+        DATA_EXECUTOR: ServiceExecutor(hass),
         DATA_ENTITIES: Entities(hass),
         DATA_STORE_CONF: conf.get(CONF_STORE),
+        DATA_CATALOG: Catalog(),
+        DATA_SNAPSHOT: SnapshotCache(hass),
+        DATA_PRICE_COMPARISON: {},
         PRODUCTS_NAME: [],
         SHOPPING_LIST_NAME: [],
         SHOPPING_LISTS_NAME: [],
@@ -55,34 +91,87 @@ async def async_setup(hass, config):
         PRODUCT_GROUPS_NAME: []
     }
 
+    # Writes queued while grocy was unreachable, loaded before a service can queue more
+    write_queue = hass.data[DOMAIN_DATA][DATA_WRITE_QUEUE]
+    await write_queue.async_load()
+
     setup_services(hass);
 
-    # Initial objects upddate
-    await hass.data[DOMAIN_DATA]['data'].async_update_data(None, wait=True, userfields=True)
+    # Initial objects update, start from the last snapshot (if any) and revalidate in the background
+    snapshot = await hass.data[DOMAIN_DATA][DATA_SNAPSHOT].async_load()
+    if snapshot:
+        _LOGGER.debug('Warm start from snapshot')
+        data.async_load_snapshot(snapshot)
+
+        async def async_revalidate():
+            await data.async_update_data(None, wait=True, userfields=True)
+            # Sensors were created from the snapshot, products may have been added or removed since
+            async_update_product_sensors(hass)
+        hass.async_create_task(async_revalidate()).add_done_callback(_log_refresh_failure)
+    else:
+        await data.async_update_data(None, wait=True, userfields=True)
 
     # Add sensors
     hass.async_create_task(
         hass.helpers.discovery.async_load_platform('sensor', DOMAIN, {}, config)
     )
 
+    # Watch grocy for changes (e.g. made from the grocy web UI)
+    scheduler.async_start(data.last_db_changed)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, scheduler.async_stop)
+
+    # Replay the writes left over from the last run
+    if len(write_queue):
+        hass.async_create_task(write_queue.async_flush())
+
     # Initialization was successful.
     return True
 
 
+def _log_refresh_failure(task):
+    """Log the failure of a background refresh."""
+    if not task.cancelled() and task.exception() is not None:
+        _LOGGER.error(f"Failed to refresh grocy data ({type(task.exception()).__name__})")
+        _LOGGER.debug(task.exception())
+
+
+class RefreshBatch:
+    """Refresh requests merged together, all waiters share one result."""
+
+    def __init__(self, loop):
+        """Initialize the class."""
+        self.sensor_types = set()
+        self.force = False
+        self.userfields = False
+        self.future = loop.create_future()
+
+    def merge(self, sensor_types, force: bool, userfields: bool):
+        """Merge another refresh request into this batch."""
+        self.sensor_types.update(sensor_types)
+        self.force = self.force or force
+        self.userfields = self.userfields or userfields
+
+
 class Data:
     """This helper class handle communication and stores the data in DOMAIN_DATA."""
 
-    def __init__(self, hass, client):
+    def __init__(self, hass, client, coalesce_delay: float = DEFAULT_COALESCE_DELAY):
         """Initialize the class."""
         self._hass = hass
         self._client = client
+        self._coalesce_delay = coalesce_delay
+        self._refresh_lock = asyncio.Lock()
+        self._pending_batch = None
+        self._last_db_changed = None
+        # Ids of optimistically added shopping list items (replaced by grocy's on the next refresh)
+        self._local_item_id = 0
         self._sensor_types_dict = {
-            PRODUCTS_NAME: self.async_update_products,
-            SHOPPING_LIST_NAME: self.async_update_shopping_list,
-            SHOPPING_LISTS_NAME: self.async_update_shopping_lists,
-            LOCATIONS_NAME: self.async_update_locations,
-            QUANTITY_UNITS_NAME: self.async_update_quantity_units,
-            PRODUCT_GROUPS_NAME: self.async_update_product_groups
+            PRODUCTS_NAME: self.async_fetch_products,
+            SHOPPING_LIST_NAME: self.async_fetch_shopping_list,
+            SHOPPING_LISTS_NAME: self.async_fetch_shopping_lists,
+            LOCATIONS_NAME: self.async_fetch_locations,
+            QUANTITY_UNITS_NAME: self.async_fetch_quantity_units,
+            PRODUCT_GROUPS_NAME: self.async_fetch_product_groups
         }
         self._sensor_update_dict = {
             PRODUCTS_NAME : None,
@@ -93,65 +182,163 @@ class Data:
             PRODUCT_GROUPS_NAME: None
         }
 
+    @property
+    def last_db_changed(self):
+        """Return grocy db-changed-time seen by the last refresh."""
+        return self._last_db_changed
+
+    @property
+    def outdated(self) -> bool:
+        """Return True if a collection was changed locally (or never fetched) since the last refresh."""
+        return None in self._sensor_update_dict.values()
+
     async def async_update_data(self, sensor_types = None, wait: bool = True, force: bool = False, userfields:bool = False):
         """Update data."""
+        if wait:
+            await self.async_refresh(sensor_types, force, userfields)
+        else:
+            self._hass.async_create_task(self.async_refresh(sensor_types, force, userfields))
+
+    async def async_refresh(self, sensor_types = None, force: bool = False, userfields:bool = False):
+        """Request a refresh, concurrent requests are coalesced into a single one."""
         sensor_types = sensor_types if sensor_types else [
             PRODUCTS_NAME, SHOPPING_LIST_NAME, SHOPPING_LISTS_NAME, LOCATIONS_NAME,
             QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME]
-        db_changed = await self._hass.async_add_executor_job(self._client.get_last_db_changed) 
-        for sensor_type in sensor_types:
-            sensor_update = self._sensor_update_dict[sensor_type]
-            if (db_changed != sensor_update) or force:
-                self._sensor_update_dict[sensor_type] = db_changed
-                if sensor_type in self._sensor_types_dict:
-                    # This is where the main logic to update platform data goes.
-                    if wait:
-                        await self._sensor_types_dict[sensor_type](userfields=userfields)
-                    else:
-                        self._hass.async_create_task(self._sensor_types_dict[sensor_type](userfields=userfields))
-
-    async def async_update_products(self, userfields:bool = False):
-        """Update data."""
-        _LOGGER.debug('Update data: ' + PRODUCTS_NAME)
+        batch = self._pending_batch
+        if batch is None:
+            batch = self._pending_batch = RefreshBatch(self._hass.loop)
+            self._hass.async_create_task(self._async_run_batch(batch))
+        batch.merge(sensor_types, force, userfields)
+        # Shield the shared result, a cancelled caller must not cancel the others
+        await asyncio.shield(batch.future)
+
+    async def _async_run_batch(self, batch: RefreshBatch):
+        """Run a coalesced refresh once the window closed and no other refresh is in flight."""
+        await asyncio.sleep(self._coalesce_delay)
+        # Requests arriving while another refresh is in flight keep joining this batch. They can't join
+        # the in-flight fetch itself, it may have started before the write they want to observe.
+        async with self._refresh_lock:
+            self._pending_batch = None
+            _LOGGER.debug(f"Refresh {sorted(batch.sensor_types)} (force={batch.force})")
+            try:
+                await self._async_do_refresh(batch.sensor_types, batch.force, batch.userfields)
+            except asyncio.CancelledError:
+                batch.future.cancel()
+                raise
+            except Exception as e:
+                batch.future.set_exception(e)
+            else:
+                batch.future.set_result(None)
+
+    async def _async_do_refresh(self, sensor_types, force: bool, userfields: bool):
+        """Fetch outdated collections concurrently and commit them as one snapshot."""
+        db_changed = self._last_db_changed = await self._client.get_last_db_changed()
+        outdated = [sensor_type for sensor_type in sensor_types
+                    if sensor_type in self._sensor_types_dict and
+                    (force or db_changed != self._sensor_update_dict[sensor_type])]
+        if not outdated:
+            return
         # This is where the main logic to update platform data goes.
-        self._hass.data[DOMAIN_DATA][PRODUCTS_NAME] = (
-            await self._hass.async_add_executor_job(self._client.get_products, userfields))
+        results = await asyncio.gather(
+            *[self._sensor_types_dict[sensor_type](userfields=userfields) for sensor_type in outdated])
+        # Commit everything at once, entities never see a partially updated snapshot
+        domain_data = self._hass.data[DOMAIN_DATA]
+        domain_data.update(zip(outdated, results))
+        changes = domain_data[DATA_CATALOG].rebuild(domain_data, outdated)
+        for sensor_type in outdated:
+            self._sensor_update_dict[sensor_type] = db_changed
+        self._async_notify_changes(changes)
+        if changes:
+            domain_data[DATA_SNAPSHOT].async_schedule_save(domain_data)
+
+    def async_load_snapshot(self, snapshot):
+        """Commit stored collections, they stay outdated until the next refresh."""
+        domain_data = self._hass.data[DOMAIN_DATA]
+        domain_data.update(snapshot)
+        domain_data[DATA_CATALOG].rebuild(domain_data, list(snapshot.keys()))
+
+    def async_apply_shopping_list_deltas(self, deltas):
+        """Apply (product id, shopping list id, amount) deltas locally, the way grocy applies them.
+
+        Entities are updated right away, the shopping list is refetched by the next refresh.
+        """
+        domain_data = self._hass.data[DOMAIN_DATA]
+        catalog = domain_data[DATA_CATALOG]
+        items = list(domain_data[SHOPPING_LIST_NAME] or [])
+        changes = CatalogChanges()
+        for product_id, shopping_list_id, amount in deltas:
+            old = next((item for item in catalog.get_product_items(product_id)
+                        if item.shopping_list_id == shopping_list_id), None)
+            if old is not None:
+                new_amount = old.amount + amount
+                new = ShoppingListProduct.from_json(dict(old.to_json(), amount=new_amount)) if new_amount > 0 else None
+            elif amount > 0:
+                self._local_item_id -= 1
+                new = ShoppingListProduct.from_json({'id': self._local_item_id, 'product_id': product_id,
+                                                     'shopping_list_id': shopping_list_id, 'amount': amount,
+                                                     'done': 0})
+            else:
+                continue
+            if old is not None:
+                items = [item for item in items if item.id != old.id]
+            if new is not None:
+                items.append(new)
+            changes.update(catalog.replace_shopping_list_item(old, new))
+        domain_data[SHOPPING_LIST_NAME] = items
+        # Refetched by the next refresh even if grocy db-changed-time didn't move
+        self._sensor_update_dict[SHOPPING_LIST_NAME] = None
+        self._async_notify_changes(changes)
+
+    def _async_notify_changes(self, changes: CatalogChanges):
+        """Update only the entities whose record (or joined lookups) changed."""
+        if not changes:
+            return
+        entities = self._hass.data[DOMAIN_DATA][DATA_ENTITIES]
+        for product_id in changes.products:
+            entities.async_schedule_update_ha_state(ProductSensor.to_entity_id(product_id))
+        for shopping_list_id in changes.shopping_lists:
+            entities.async_schedule_update_ha_state(ShoppingListSensor.to_entity_id(shopping_list_id))
+        if PRODUCTS_NAME in changes.collections:
+            entities.async_schedule_update_ha_state(GrocySensor.ENTITY_ID)
+
+    async def async_fetch_products(self, userfields:bool = False):
+        """Fetch data."""
+        _LOGGER.debug('Fetch data: ' + PRODUCTS_NAME)
+        products = await self._client.get_products(userfields)
+        if not userfields:
+            # Keep the userfields we already have (older grocy versions don't return them inline)
+            catalog = self._hass.data[DOMAIN_DATA][DATA_CATALOG]
+            for index, product in enumerate(products):
+                known = catalog.get_product(product.id)
+                if not product.userfields and known and known.userfields:
+                    products[index] = product.with_userfields(known.userfields)
+        return products
+
+    async def async_fetch_shopping_list(self, userfields:bool = False):
+        """Fetch data."""
+        _LOGGER.debug('Fetch data: ' + SHOPPING_LIST_NAME)
+        return await self._client.shopping_list()
+
+    async def async_fetch_shopping_lists(self, userfields:bool = False):
+        """Fetch data."""
+        _LOGGER.debug('Fetch data: ' + SHOPPING_LISTS_NAME)
+        return await self._client.shopping_lists()
+
+    async def async_fetch_locations(self, userfields:bool = False):
+        """Fetch data."""
+        _LOGGER.debug('Fetch data: ' + LOCATIONS_NAME)
+        return await self._client.locations()
+
+    async def async_fetch_quantity_units(self, userfields:bool = False):
+        """Fetch data."""
+        _LOGGER.debug('Fetch data: ' + QUANTITY_UNITS_NAME)
+        return await self._client.quantity_units()
+
+    async def async_fetch_product_groups(self, userfields:bool = False):
+        """Fetch data."""
+        _LOGGER.debug('Fetch data: ' + PRODUCT_GROUPS_NAME)
+        return await self._client.product_groups()
 
-    async def async_update_shopping_list(self, userfields:bool = False):
-        """Update data."""
-        _LOGGER.debug('Update data: ' + SHOPPING_LIST_NAME)
-        # This is where the main logic to update platform data goes.
-        self._hass.data[DOMAIN_DATA][SHOPPING_LIST_NAME] = (
-            await self._hass.async_add_executor_job(self._client.shopping_list))
-
-    async def async_update_shopping_lists(self, userfields:bool = False):
-        """Update data."""
-        _LOGGER.debug('Update data: ' + SHOPPING_LISTS_NAME)
-        # This is where the main logic to update platform data goes.
-        self._hass.data[DOMAIN_DATA][SHOPPING_LISTS_NAME] = (
-            await self._hass.async_add_executor_job(self._client.shopping_lists))
-
-    async def async_update_locations(self, userfields:bool = False):
-        """Update data."""
-        _LOGGER.debug('Update data: ' + LOCATIONS_NAME)
-        # This is where the main logic to update platform data goes.
-        self._hass.data[DOMAIN_DATA][LOCATIONS_NAME] = (
-            await self._hass.async_add_executor_job(self._client.locations))
-
-    async def async_update_quantity_units(self, userfields:bool = False):
-        """Update data."""
-        _LOGGER.debug('Update data: ' + QUANTITY_UNITS_NAME)
-        # This is where the main logic to update platform data goes.
-        self._hass.data[DOMAIN_DATA][QUANTITY_UNITS_NAME] = (
-            await self._hass.async_add_executor_job(self._client.quantity_units))
-
-    async def async_update_product_groups(self, userfields:bool = False):
-        """Update data."""
-        _LOGGER.debug('Update data: ' + PRODUCT_GROUPS_NAME)
-        # This is where the main logic to update platform data goes.
-        self._hass.data[DOMAIN_DATA][PRODUCT_GROUPS_NAME] = (
-            await self._hass.async_add_executor_job(self._client.product_groups))
-            
 
 class Entities:
     """This helper class handle and store integration entities."""
@@ -159,46 +346,73 @@ class Entities:
     def __init__(self, hass):
         """Initialize the class."""
         self._hass = hass
-        self._entities = []
+        self._entities = {}
+        # Lookup indexes: barcode -> entity, class name -> {entity_id: entity}
+        self._entities_by_barcode = {}
+        self._entities_by_class_name = {}
+        self._entity_barcodes = {}
 
     def async_add(self, entity, update: bool = False):
         """Handle add entity to entity registry"""
         _LOGGER.debug("Add {}".format(entity.name))
-        self._entities.append(entity)
-        
+        self._add(entity)
+
+    def _add(self, entity):
+        self.async_remove(entity.entity_id)
+        self._entities[entity.entity_id] = entity
+        self._entities_by_class_name.setdefault(type(entity).__name__, {})[entity.entity_id] = entity
+        self.async_reindex(entity)
+
+    def async_add_many(self, entities):
+        """Handle add of many entities to entity registry"""
+        _LOGGER.debug("Add {} entities".format(len(entities)))
+        for entity in entities:
+            self._add(entity)
+
+    def async_reindex(self, entity):
+        """Update the barcode index of an entity (e.g. product barcodes were changed)"""
+        self._unindex_barcodes(entity.entity_id)
+        barcodes = [barcode for barcode in (getattr(entity, 'barcodes', None) or []) if barcode]
+        for barcode in barcodes:
+            self._entities_by_barcode[barcode] = entity
+        self._entity_barcodes[entity.entity_id] = barcodes
+
+    def _unindex_barcodes(self, entity_id):
+        for barcode in self._entity_barcodes.pop(entity_id, []):
+            if self._entities_by_barcode.get(barcode) is self._entities.get(entity_id):
+                del self._entities_by_barcode[barcode]
+
     def async_get(self, entity_id):
-        for entity in self._entities:
-            if entity.entity_id == entity_id:
-                return entity
-        return None
+        return self._entities.get(entity_id)
 
     def async_get_by_barcode(self, barcode):
-        for entity in self._entities:
-            barcodes = entity.device_state_attributes.get('barcodes')
-            if barcodes and barcodes[0] == barcode:
-                return entity
-        return None
+        return self._entities_by_barcode.get(barcode)
 
     def async_get_all_by_class_name(self, class_name):
-        entities = []
-        for entity in self._entities:
-            if type(entity).__name__ == class_name:
-                entities.append(entity)
-        return entities;
+        return list(self._entities_by_class_name.get(class_name, {}).values())
+
+    def async_count_by_class_name(self, class_name) -> int:
+        return len(self._entities_by_class_name.get(class_name, {}))
 
     def async_get_all(self):
         """Return all registered entities"""
-        return self._entities
+        return list(self._entities.values())
 
     def async_remove(self, entity_id):
         """Handle the removal of an entity."""
-        self._entities = [e for e in self._entities if e.entity_id != entity_id]
+        entity = self._entities.get(entity_id)
+        if entity is None:
+            return True
+        self._unindex_barcodes(entity_id)
+        del self._entities[entity_id]
+        del self._entities_by_class_name[type(entity).__name__][entity_id]
         return True
     
     def async_schedule_update_ha_state(self, entity_id):
         entity = self.async_get(entity_id)
-        if entity:
+        # Skip entities not added to home assistant yet, they update when added
+        if entity and entity.hass:
             entity.async_schedule_update_ha_state(True)
 
     def is_exists(self, entity_id) -> bool:
-        return True if self.async_get(entity_id) else False
\ No newline at end of file
+        return entity_id in self._entities
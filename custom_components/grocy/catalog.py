@@ -0,0 +1,280 @@
+'''Indexed in-memory view of the grocy collections'''
+
+import logging
+
+from .const import (PRODUCTS_NAME, SHOPPING_LISTS_NAME, SHOPPING_LIST_NAME, LOCATIONS_NAME,
+                    QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    """Return a hashable equivalent of a (nested) attribute value."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def fingerprint(obj) -> int:
+    """Return a content hash of a grocy object."""
+    return hash(_freeze(obj.as_dict()))
+
+
+class CatalogChanges:
+    """What a catalog rebuild changed: collections, product ids and shopping list ids."""
+
+    def __init__(self):
+        """Initialize the class."""
+        self.collections = set()
+        self.products = set()
+        self.shopping_lists = set()
+
+    def __bool__(self):
+        return bool(self.collections)
+
+    def update(self, other):
+        """Merge the changes of another rebuild or local apply."""
+        self.collections.update(other.collections)
+        self.products.update(other.products)
+        self.shopping_lists.update(other.shopping_lists)
+
+
+class ShoppingListTotals:
+    """Aggregates of one shopping list, maintained incrementally."""
+
+    def __init__(self):
+        """Initialize the class."""
+        self.count = 0
+        self.total_amount = 0
+        self.total_price = 0
+        self.by_product_group = {}
+        self.by_store = {}
+
+    def add(self, contribution, sign: int = 1):
+        """Add (sign=1) or subtract (sign=-1) an item contribution."""
+        amount, price, product_group_name, store = contribution
+        self.count += sign
+        self.total_amount += sign * amount
+        self.total_price += sign * price
+        self._add_breakdown(self.by_product_group, product_group_name, amount, price, sign)
+        self._add_breakdown(self.by_store, store, amount, price, sign)
+
+    @staticmethod
+    def _add_breakdown(breakdown, key, amount, price, sign: int):
+        entry = breakdown.setdefault(key, {'count': 0, 'amount': 0, 'price': 0})
+        entry['count'] += sign
+        entry['amount'] += sign * amount
+        entry['price'] += sign * price
+        if entry['count'] <= 0:
+            del breakdown[key]
+
+    def as_attributes(self):
+        """Return the aggregates as sensor attributes."""
+        return {
+            'total_amount': self.total_amount,
+            'total_price': round(self.total_price, 2),
+            'product_groups': self._round_breakdown(self.by_product_group),
+            'stores': self._round_breakdown(self.by_store)
+        }
+
+    @staticmethod
+    def _round_breakdown(breakdown):
+        return {key: dict(entry, price=round(entry['price'], 2)) for key, entry in breakdown.items()}
+
+
+class Catalog:
+    """Id keyed indexes over the collections in DOMAIN_DATA, rebuilt once per refresh."""
+
+    def __init__(self):
+        """Initialize the class."""
+        self._products = {}
+        self._product_groups = {}
+        self._locations = {}
+        self._quantity_units = {}
+        self._shopping_lists = {}
+        # product id -> shopping list items, shopping list id -> shopping list items
+        self._items_by_product = {}
+        self._items_by_list = {}
+        # shopping list id -> totals, item id -> (shopping list id, contribution)
+        self._totals = {}
+        self._contributions = {}
+        # collection name -> content hash, product id -> hash of the product and its joined lookups
+        self._collection_fingerprints = {}
+        self._product_fingerprints = {}
+
+    def rebuild(self, data, sensor_types = None) -> CatalogChanges:
+        """Rebuild the indexes of the given collections (all when None), return what changed."""
+        sensor_types = sensor_types if sensor_types else [
+            PRODUCTS_NAME, SHOPPING_LIST_NAME, SHOPPING_LISTS_NAME, LOCATIONS_NAME,
+            QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME]
+        changes = CatalogChanges()
+        for sensor_type in sensor_types:
+            collection_fingerprint = hash(tuple(fingerprint(obj) for obj in data[sensor_type] or []))
+            if collection_fingerprint != self._collection_fingerprints.get(sensor_type):
+                self._collection_fingerprints[sensor_type] = collection_fingerprint
+                changes.collections.add(sensor_type)
+        # Unchanged collections keep their indexes
+        sensor_types = changes.collections
+        if not sensor_types:
+            return changes
+        if PRODUCTS_NAME in sensor_types:
+            self._products = self._index(data[PRODUCTS_NAME])
+        if PRODUCT_GROUPS_NAME in sensor_types:
+            self._product_groups = self._index(data[PRODUCT_GROUPS_NAME])
+        if LOCATIONS_NAME in sensor_types:
+            self._locations = self._index(data[LOCATIONS_NAME])
+        if QUANTITY_UNITS_NAME in sensor_types:
+            self._quantity_units = self._index(data[QUANTITY_UNITS_NAME])
+        if SHOPPING_LISTS_NAME in sensor_types:
+            self._shopping_lists = self._index(data[SHOPPING_LISTS_NAME])
+        if SHOPPING_LIST_NAME in sensor_types:
+            self._items_by_product = {}
+            self._items_by_list = {}
+            for item in data[SHOPPING_LIST_NAME] or []:
+                self._items_by_product.setdefault(item.product_id, []).append(item)
+                self._items_by_list.setdefault(item.shopping_list_id, []).append(item)
+        if sensor_types & {SHOPPING_LIST_NAME, PRODUCTS_NAME, PRODUCT_GROUPS_NAME}:
+            self._update_totals(changes)
+        if sensor_types & {SHOPPING_LIST_NAME, PRODUCTS_NAME, PRODUCT_GROUPS_NAME,
+                           LOCATIONS_NAME, QUANTITY_UNITS_NAME}:
+            self._update_product_fingerprints(changes)
+        _LOGGER.debug(f"Catalog rebuilt: {sorted(sensor_types)}, {len(changes.products)} products changed")
+        return changes
+
+    def _product_fingerprint(self, product) -> int:
+        """Hash of everything a product sensor shows: the product, its lookups and its list items."""
+        product_group = self._product_groups.get(product.product_group_id)
+        location = self._locations.get(product.location_id)
+        quantity_unit = self._quantity_units.get(product.qu_id_purchase)
+        items = tuple((item.shopping_list_id, item.amount, item.done, item.note)
+                      for item in self._items_by_product.get(product.id, []))
+        return hash((fingerprint(product),
+                     product_group.name if product_group else None,
+                     location.name if location else None,
+                     quantity_unit.name if quantity_unit else None,
+                     items))
+
+    def _update_product_fingerprints(self, changes: CatalogChanges):
+        fingerprints = {product_id: self._product_fingerprint(product)
+                        for product_id, product in self._products.items()}
+        for product_id, product_fingerprint in fingerprints.items():
+            if self._product_fingerprints.get(product_id) != product_fingerprint:
+                changes.products.add(product_id)
+        changes.products.update(self._product_fingerprints.keys() - fingerprints.keys())
+        self._product_fingerprints = fingerprints
+
+    @staticmethod
+    def _index(objects):
+        return {obj.id: obj for obj in objects or []}
+
+    def _contribution(self, item):
+        """Return the (amount, price, product group name, store) an item adds to its list totals."""
+        product = self._products.get(item.product_id)
+        if product is None:
+            return (item.amount, 0, 'Other', 'None')
+        product_group = self._product_groups.get(product.product_group_id)
+        return (item.amount, (product.price or 0) * item.amount,
+                product_group.name if product_group else 'Other',
+                product.userfields.get('store') or 'None')
+
+    def _update_totals(self, changes: CatalogChanges):
+        """Apply only the contributions that changed since the last refresh."""
+        seen = set()
+        for items in self._items_by_list.values():
+            for item in items:
+                seen.add(item.id)
+                self._set_contribution(item.id, item.shopping_list_id, self._contribution(item), changes)
+        for item_id in self._contributions.keys() - seen:
+            self._set_contribution(item_id, None, None, changes)
+
+    def _set_contribution(self, item_id, shopping_list_id, contribution, changes: CatalogChanges):
+        old = self._contributions.get(item_id)
+        new = (shopping_list_id, contribution) if contribution is not None else None
+        if old == new:
+            return
+        if old is not None:
+            self._totals[old[0]].add(old[1], -1)
+            changes.shopping_lists.add(old[0])
+        if new is not None:
+            changes.shopping_lists.add(shopping_list_id)
+            self._totals.setdefault(shopping_list_id, ShoppingListTotals()).add(contribution)
+            self._contributions[item_id] = new
+        else:
+            del self._contributions[item_id]
+
+    def replace_shopping_list_item(self, old, new) -> CatalogChanges:
+        """Apply a local shopping list change (old or new is None for an added or removed item).
+
+        Only the item, its list totals and its product are updated. The shopping list collection
+        is marked changed, so the next rebuild reindexes it from grocy.
+        """
+        changes = CatalogChanges()
+        changes.collections.add(SHOPPING_LIST_NAME)
+        self._collection_fingerprints.pop(SHOPPING_LIST_NAME, None)
+        product_ids = set()
+        if old is not None:
+            self._unindex_item(self._items_by_product, old.product_id, old.id)
+            self._unindex_item(self._items_by_list, old.shopping_list_id, old.id)
+            self._set_contribution(old.id, None, None, changes)
+            product_ids.add(old.product_id)
+        if new is not None:
+            self._items_by_product.setdefault(new.product_id, []).append(new)
+            self._items_by_list.setdefault(new.shopping_list_id, []).append(new)
+            self._set_contribution(new.id, new.shopping_list_id, self._contribution(new), changes)
+            product_ids.add(new.product_id)
+        for product_id in product_ids:
+            product = self._products.get(product_id)
+            if product is not None:
+                self._product_fingerprints[product_id] = self._product_fingerprint(product)
+                changes.products.add(product_id)
+        return changes
+
+    @staticmethod
+    def _unindex_item(index, key, item_id):
+        items = [item for item in index.get(key, []) if item.id != item_id]
+        if items:
+            index[key] = items
+        else:
+            index.pop(key, None)
+
+    def get_product(self, product_id):
+        """Return product by id (None if not found)."""
+        return self._products.get(product_id)
+
+    def get_products(self):
+        """Return all products."""
+        return self._products.values()
+
+    def has_product(self, product_id) -> bool:
+        """Return True if product exists."""
+        return product_id in self._products
+
+    def get_product_group(self, product_group_id):
+        """Return product group by id (None if not found)."""
+        return self._product_groups.get(product_group_id)
+
+    def get_location(self, location_id):
+        """Return location by id (None if not found)."""
+        return self._locations.get(location_id)
+
+    def get_quantity_unit(self, quantity_unit_id):
+        """Return quantity unit by id (None if not found)."""
+        return self._quantity_units.get(quantity_unit_id)
+
+    def get_shopping_list(self, shopping_list_id):
+        """Return shopping list by id (None if not found)."""
+        return self._shopping_lists.get(shopping_list_id)
+
+    def get_product_items(self, product_id):
+        """Return the shopping list items of a product."""
+        return self._items_by_product.get(product_id, [])
+
+    def get_shopping_list_items(self, shopping_list_id):
+        """Return the items of a shopping list."""
+        return self._items_by_list.get(shopping_list_id, [])
+
+    def get_shopping_list_totals(self, shopping_list_id) -> ShoppingListTotals:
+        """Return the aggregates of a shopping list."""
+        return self._totals.get(shopping_list_id) or ShoppingListTotals()
@@ -11,6 +11,12 @@ DATA_GROCY = "grocy"
 DATA_DATA = "data"
 DATA_ENTITIES = "entities"
 DATA_STORE_CONF = "store_conf"
+DATA_CATALOG = "catalog"
+DATA_SCHEDULER = "scheduler"
+DATA_SNAPSHOT = "snapshot"
+DATA_WRITE_QUEUE = "write_queue"
+DATA_EXECUTOR = "executor"
+DATA_PRICE_COMPARISON = "price_comparison"
 
 # Domain events
 EVENT_ADDED_TO_LIST='added_to_list'
@@ -19,6 +25,9 @@ EVENT_PRODUCT_REMOVED='product_removed'
 EVENT_PRODUCT_ADDED='product_added'
 EVENT_PRODUCT_UPDATED='product_updated'
 EVENT_SYNC_DONE='sync_done'
+EVENT_SYNC_PROGRESS='sync_progress'
+EVENT_CART_SYNCED='cart_synced'
+EVENT_PRICES_COMPARED='prices_compared'
 EVENT_GROCY_ERROR='error'
 
 # Configuration
@@ -33,12 +42,27 @@ CONF_PRODUCT_LOCATION_ID = 'product_location_id'
 CONF_STORE = 'store'
 CONF_BARCODE = 'barcode'
 CONF_UNIT_OF_MEASUREMENT = 'unit_of_measurement'
+CONF_MAX_CONNECTIONS = 'max_connections'
+CONF_HEDGE_DELAY = 'hedge_delay'
 
 # Defaults
 DEFAULT_AMOUNT = 1
 DEFAULT_STORE = ''
 DEFAULT_SHOPPING_LIST_ID = 1
 DEFAULT_PRODUCT_DESCRIPTION = ""
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_COALESCE_DELAY = 0.2
+DEFAULT_MIN_POLL_INTERVAL = 2
+DEFAULT_MAX_POLL_INTERVAL = 300
+DEFAULT_POLL_BACKOFF = 2
+DEFAULT_REPLAY_BATCH_SIZE = 10
+DEFAULT_MIN_RETRY_INTERVAL = 5
+DEFAULT_MAX_RETRY_INTERVAL = 300
+DEFAULT_MAX_CONCURRENT_SERVICES = 4
+DEFAULT_STORE_RATE_LIMIT = 5
+DEFAULT_STORE_CONCURRENCY = 4
+DEFAULT_PROGRESS_STEP = 10
+DEFAULT_STORE_TIMEOUT = 10
 
 # Services
 ADD_TO_LIST_SERVICE = DOMAIN_SERVICE.format('add_to_list')
@@ -50,6 +74,7 @@ REMOVE_FAVORITE_SERVICE = DOMAIN_SERVICE.format('remove_favorite')
 FILL_CART_SERVICE = DOMAIN_SERVICE.format('fill_cart')
 EMPTY_CART_SERVICE = DOMAIN_SERVICE.format('empty_cart')
 SYNC_SERVICE = DOMAIN_SERVICE.format('sync')
+COMPARE_PRICES_SERVICE = DOMAIN_SERVICE.format('compare_prices')
 DEBUG_SERVICE = DOMAIN_SERVICE.format('debug')
 
 # Device classes
@@ -0,0 +1,116 @@
+'''Service execution engine'''
+
+import asyncio
+import logging
+import time
+
+from .const import DEFAULT_MAX_CONCURRENT_SERVICES
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ServiceExecutor:
+    """Run service calls with bounded concurrency, serialized per key (e.g. product).
+
+    Blocking (store) calls are run in the HA executor so they never block the event loop.
+    Queue depth and latency are kept for the grocy sensor.
+    """
+
+    def __init__(self, hass, max_concurrency: int = DEFAULT_MAX_CONCURRENT_SERVICES):
+        """Initialize the class."""
+        self._hass = hass
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # key -> lock, key -> calls holding or waiting for the lock
+        self._locks = {}
+        self._users = {}
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._last_latency = 0
+        self._max_latency = 0
+        self._total_latency = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Return the number of calls waiting to run."""
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        """Return the number of running calls."""
+        return self._active
+
+    def _acquire_lock(self, key):
+        self._users[key] = self._users.get(key, 0) + 1
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def _release_lock(self, key):
+        self._users[key] -= 1
+        if not self._users[key]:
+            del self._users[key]
+            del self._locks[key]
+
+    async def async_run(self, coro, key = None):
+        """Run a service coroutine, after any earlier call sharing a key.
+
+        key is a single key or a list of keys (a call about several products)."""
+        queued_at = time.monotonic()
+        started = False
+        self._queued += 1
+        if key is None:
+            keys = []
+        elif isinstance(key, (list, tuple, set)):
+            # Always locked in the same order, so overlapping calls can't deadlock
+            keys = sorted(set(key))
+        else:
+            keys = [key]
+        locks = [self._acquire_lock(key) for key in keys]
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            async with self._semaphore:
+                self._queued -= 1
+                self._active += 1
+                started = True
+                try:
+                    return await coro
+                except Exception:
+                    self._failed += 1
+                    raise
+                finally:
+                    self._active -= 1
+                    self._record(time.monotonic() - queued_at)
+        finally:
+            if not started:
+                # Cancelled while waiting
+                self._queued -= 1
+                coro.close()
+            for lock in acquired:
+                lock.release()
+            for key in keys:
+                self._release_lock(key)
+
+    async def async_run_blocking(self, func, *args):
+        """Run a blocking function (e.g. a store request) in the HA executor."""
+        return await self._hass.async_add_executor_job(func, *args)
+
+    def _record(self, latency: float):
+        self._completed += 1
+        self._last_latency = latency
+        self._max_latency = max(self._max_latency, latency)
+        self._total_latency += latency
+
+    def as_attributes(self):
+        """Return the queue metrics as sensor attributes."""
+        return {
+            'service_queue_depth': self._queued,
+            'service_active': self._active,
+            'service_completed': self._completed,
+            'service_failed': self._failed,
+            'service_last_latency': round(self._last_latency, 3),
+            'service_avg_latency': round(self._total_latency / self._completed, 3) if self._completed else 0,
+            'service_max_latency': round(self._max_latency, 3)
+        }
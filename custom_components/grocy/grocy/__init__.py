@@ -1,3 +1,3 @@
 """The grocy module"""
 
-from .grocy import Grocy
\ No newline at end of file
+from .grocy import Grocy, AsyncGrocy
\ No newline at end of file
@@ -2,16 +2,18 @@ import logging
 
 from typing import List
 
-from .grocy_api_client import (DEFAULT_PORT_NUMBER,
-                               GrocyApiClient, ShoppingList,
+from .grocy_api_client import (DEFAULT_PORT_NUMBER, DEFAULT_POOL_LIMIT, DEFAULT_USERFIELDS_CONCURRENCY,
+                               GrocyApiClient, AsyncGrocyApiClient, ShoppingList,
                                LocationData, ProductData, LocationData,
                                QuantityUnitData, ProductGroupData,
-                               ShoppingListItem)
+                               ShoppingListItem, GrocyModel)
 
 _LOGGER = logging.getLogger(__name__)
         
 
-class ShoppingListProduct(object):
+class ShoppingListProduct(GrocyModel):
+    __slots__ = ('_id', '_product_id', '_note', '_amount', '_done', '_product', '_shopping_list_id')
+
     def __init__(self, raw_shopping_list: ShoppingListItem):
         self._id = raw_shopping_list.id
         self._product_id = raw_shopping_list.product_id
@@ -20,6 +22,20 @@ class ShoppingListProduct(object):
         self._done = raw_shopping_list.done
         self._product = None
         self._shopping_list_id = raw_shopping_list.shopping_list_id
+
+    def to_json(self):
+        return {
+            'id': self._id,
+            'product_id': self._product_id,
+            'note': self._note,
+            'amount': self._amount,
+            'shopping_list_id': self._shopping_list_id,
+            'done': self._done
+        }
+
+    @classmethod
+    def from_json(cls, parsed_json):
+        return cls(ShoppingListItem(parsed_json))
         
     def get_details(self, api_client: GrocyApiClient):
         if self._product_id:
@@ -57,8 +73,9 @@ class ShoppingListProduct(object):
 
 
 class Grocy(object):
-    def __init__(self, base_url, api_key, port: int = DEFAULT_PORT_NUMBER, verify_ssl = True):
-        self._api_client = GrocyApiClient(base_url, api_key, port, verify_ssl)
+    def __init__(self, base_url, api_key, port: int = DEFAULT_PORT_NUMBER, verify_ssl = True,
+                 policy = None):
+        self._api_client = GrocyApiClient(base_url, api_key, port, verify_ssl, policy=policy)
 
     def is_connected(self):
         # ???
@@ -76,11 +93,16 @@ class Grocy(object):
     def product_groups(self) -> List[ProductGroupData]:
         return self._api_client.get_product_groups()
 
-    def get_products(self, userfields:bool = False) -> List[ProductData]:
+    def get_products(self, userfields:bool = False, progress_callback = None) -> List[ProductData]:
         products = self._api_client.get_products()
-        if userfields:
-            for product in products:
-                product.userfields = self._api_client.get_userfields('products', product.id)
+        if userfields and not self._api_client.inline_userfields:
+            # Older grocy versions, fetch userfields of all products in parallel
+            index = {product.id: i for i, product in enumerate(products)}
+            for done, (product_id, values) in enumerate(
+                    self._api_client.iter_userfields('products', index.keys()), 1):
+                products[index[product_id]] = products[index[product_id]].with_userfields(values or {})
+                if progress_callback:
+                    progress_callback(done, len(products))
         return products
 
     def add_product(self, id, name, barcode, description,
@@ -115,8 +137,8 @@ class Grocy(object):
     def shopping_lists(self) -> List[ShoppingList]:
         return self._api_client.get_shopping_lists()
 
-    def shopping_list(self, shopping_list_id: int = 1, get_details: bool = False) -> List[ShoppingListProduct]:
-        raw_shoppinglist = self._api_client.get_shopping_list(shopping_list_id)
+    def shopping_list(self, shopping_list_id: int = 1, get_details: bool = False, since = None) -> List[ShoppingListProduct]:
+        raw_shoppinglist = self._api_client.get_shopping_list(shopping_list_id, since)
         if raw_shoppinglist is None:
             return
         shopping_list = [ShoppingListProduct(resp) for resp in raw_shoppinglist]
@@ -147,4 +169,108 @@ class Grocy(object):
         return self._api_client.set_userfields(entity, object_id, data)
 
     def get_last_db_changed(self):
-        return self._api_client.get_last_db_changed()
\ No newline at end of file
+        return self._api_client.get_last_db_changed()
+
+
+class AsyncGrocy(object):
+    def __init__(self, base_url, api_key, port: int = DEFAULT_PORT_NUMBER, verify_ssl = True,
+                 session = None, pool_limit: int = DEFAULT_POOL_LIMIT, policy = None):
+        self._api_client = AsyncGrocyApiClient(base_url, api_key, port, verify_ssl,
+                                               session=session, pool_limit=pool_limit, policy=policy)
+        # Never open more parallel userfield requests than allowed connections
+        self._userfields_concurrency = min(pool_limit, DEFAULT_USERFIELDS_CONCURRENCY)
+
+    def is_connected(self):
+        # ???
+        return True
+
+    async def close(self):
+        await self._api_client.close()
+
+    async def get_info(self):
+        return await self._api_client.get_info()
+
+    async def locations(self) -> List[LocationData]:
+        return await self._api_client.get_locations()
+
+    async def quantity_units(self) -> List[QuantityUnitData]:
+        return await self._api_client.get_quantity_units()
+
+    async def product_groups(self) -> List[ProductGroupData]:
+        return await self._api_client.get_product_groups()
+
+    async def get_products(self, userfields:bool = False, progress_callback = None) -> List[ProductData]:
+        products = await self._api_client.get_products()
+        if userfields and not self._api_client.inline_userfields:
+            # Older grocy versions, fetch userfields of all products concurrently
+            index = {product.id: i for i, product in enumerate(products)}
+            done = 0
+            async for product_id, values in self._api_client.iter_userfields(
+                    'products', index.keys(), self._userfields_concurrency):
+                products[index[product_id]] = products[index[product_id]].with_userfields(values or {})
+                done += 1
+                if progress_callback:
+                    progress_callback(done, len(products))
+        return products
+
+    async def add_product(self, id, name, barcode, description,
+                          product_group_id, qu_id_purchase, location_id, picture):
+        return await self._api_client.add_product(id, name, barcode, description,
+                                                  product_group_id, qu_id_purchase, location_id, picture)
+
+    async def update_product(self, id, name = None, barcode = None, description = None,
+                             product_group_id = None, qu_id_purchase = None, location_id = None,
+                             picture = None):
+        return await self._api_client.update_product(id, name, barcode, description,
+                                                     product_group_id, qu_id_purchase, location_id, picture)
+
+    async def remove_product(self, id):
+        return await self._api_client.remove_objects_products(id)
+
+    async def add_product_group(self, id, name):
+        return await self._api_client.add_product_group(id, name)
+
+    async def add_location(self, id, name):
+        return await self._api_client.add_location(id, name)
+
+    async def add_quantity_unit(self, id, name):
+        return await self._api_client.add_quantity_unit(id, name)
+
+    async def add_shopping_list(self, id, name):
+        return await self._api_client.add_shopping_list(id, name)
+
+    async def get_product_by_barcode(self, barcode) -> ProductData:
+        return await self._api_client.get_product_by_barcode(barcode)
+
+    async def shopping_lists(self) -> List[ShoppingList]:
+        return await self._api_client.get_shopping_lists()
+
+    async def shopping_list(self, shopping_list_id: int = 1, since = None) -> List[ShoppingListProduct]:
+        raw_shoppinglist = await self._api_client.get_shopping_list(shopping_list_id, since)
+        if raw_shoppinglist is None:
+            return
+        return [ShoppingListProduct(resp) for resp in raw_shoppinglist]
+
+    async def add_product_to_shopping_list(self, product_id: int, shopping_list_id: int = 1, amount: int = 1):
+        return await self._api_client.add_product_to_shopping_list(product_id, shopping_list_id, amount)
+
+    async def clear_shopping_list(self, shopping_list_id: int = 1):
+        return await self._api_client.clear_shopping_list(shopping_list_id)
+
+    async def remove_product_in_shopping_list(self, product_id: int, shopping_list_id: int = 1, amount: int = 1):
+        return await self._api_client.remove_product_in_shopping_list(product_id, shopping_list_id, amount)
+
+    async def complete_product_in_shopping_list(self, id: int, complete: int = 1):
+        return await self._api_client.complete_product_in_shopping_list(id, complete)
+
+    async def set_userfield(self, entity: str, object_id: int, key: str, value):
+        return await self._api_client.set_userfield(entity, object_id, key, value)
+
+    async def get_userfields(self, entity: str, object_id: int):
+        return await self._api_client.get_userfields(entity, object_id)
+
+    async def set_userfields(self, entity: str, object_id: int, data):
+        return await self._api_client.set_userfields(entity, object_id, data)
+
+    async def get_last_db_changed(self):
+        return await self._api_client.get_last_db_changed()
@@ -1,18 +1,107 @@
+import asyncio
+import copy
+import json
 import logging
+import re
+import aiohttp
 import requests
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List
+from typing import List, Tuple
 from urllib.parse import urljoin
 
-from .utils import parse_date, parse_int, parse_float
+from .utils import parse_date, format_date, parse_int, parse_float
+from .transport import TransportPolicy, DEFAULT_POLICY
 
 DEFAULT_PORT_NUMBER=9192
+DEFAULT_POOL_LIMIT=10
+DEFAULT_KEEPALIVE_TIMEOUT=30
+DEFAULT_USERFIELDS_CONCURRENCY=10
+DEFAULT_PAGE_SIZE=500
 
 _LOGGER = logging.getLogger(__name__)
+
+# Grocy query[] condition, e.g. "shopping_list_id=1" or "row_created_timestamp>2020-01-01 00:00:00"
+_CONDITION_RE = re.compile(r'^(\w+)(!=|<=|>=|!~|=|<|>|~)(.*)$')
+
+
+def since_condition(since) -> str:
+    '''query[] condition of rows created after since (datetime or grocy timestamp string)'''
+    if isinstance(since, datetime):
+        since = since.strftime('%Y-%m-%d %H:%M:%S')
+    return f"row_created_timestamp>{since}"
+
+
+def build_query_params(query = None, order: str = None, limit: int = None, offset: int = None):
+    '''Return grocy objects query parameters, query is a list of conditions, order is "field[:asc|desc]"'''
+    params = [('query[]', condition) for condition in query or []]
+    if order is not None:
+        params.append(('order', order))
+    if limit is not None:
+        params.append(('limit', str(limit)))
+        if offset:
+            params.append(('offset', str(offset)))
+    return params
+
+
+def _compare_key(value):
+    # Numeric columns are returned as strings, compare them as numbers
+    number = parse_float(value)
+    return (0, number, '') if number is not None else (1, 0, str(value or ''))
+
+
+def _match(row, condition) -> bool:
+    match = _CONDITION_RE.match(condition)
+    if match is None:
+        return True
+    field, op, value = match.groups()
+    if field not in row:
+        return True
+    if op in ('~', '!~'):
+        return (value.lower() in str(row[field] or '').lower()) == (op == '~')
+    left, right = _compare_key(row[field]), _compare_key(value)
+    return {
+        '=': left == right, '!=': left != right,
+        '<': left < right, '>': left > right,
+        '<=': left <= right, '>=': left >= right
+    }[op]
+
+
+def apply_query(rows, query = None, order: str = None, limit: int = None, offset: int = None):
+    '''Filter, order and page rows in Python (older grocy versions ignore the query parameters)
+
+    Rows are always returned in the given order (with or without a limit), the sort is
+    stable so rows grocy already ordered keep their order.
+    '''
+    if query:
+        rows = [row for row in rows if all(_match(row, condition) for condition in query)]
+    if order:
+        field, _, direction = order.partition(':')
+        rows = sorted(rows, key=lambda row: _compare_key(row.get(field)), reverse=direction == 'desc')
+    if limit is not None and len(rows) > limit:
+        # Paging was ignored by grocy
+        rows = rows[offset or 0:(offset or 0) + limit]
+    return rows
     
 
-class ShoppingListItem(object):
+class GrocyModel(object):
+    '''Base of the slot based (no per instance __dict__) read only models'''
+    __slots__ = ()
+
+    def as_dict(self):
+        '''Export the attributes (without the leading underscore)'''
+        return {slot[1:]: getattr(self, slot)
+                for cls in reversed(type(self).__mro__) for slot in getattr(cls, '__slots__', ())}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()})"
+
+
+class ShoppingListItem(GrocyModel):
+    __slots__ = ('_id', '_product_id', '_note', '_amount', '_row_created_timestamp',
+                 '_shopping_list_id', '_done')
+
     def __init__(self, parsed_json):
         self._id = parse_int(parsed_json.get('id'))
         self._product_id = parse_int(parsed_json.get('product_id', None))
@@ -47,13 +136,24 @@ class ShoppingListItem(object):
         return self._done
 
 
-class GrocyObject(object):
+class GrocyObject(GrocyModel):
+    __slots__ = ('_id', '_name', '_description', '_row_created_timestamp')
+
     def __init__(self, parsed_json):
         self._id = parse_int(parsed_json.get('id'))
         self._name = parsed_json.get('name')
         self._description = parsed_json.get('description')
         self._row_created_timestamp = parse_date(parsed_json.get('row_created_timestamp', None))
 
+    def to_json(self):
+        '''Export in the grocy api format (the constructor input), used by the snapshot'''
+        return {
+            'id': self._id,
+            'name': self._name,
+            'description': self._description,
+            'row_created_timestamp': format_date(self._row_created_timestamp)
+        }
+
     @property
     def id(self) -> int:
         return self._id
@@ -68,6 +168,10 @@ class GrocyObject(object):
 
         
 class ProductData(GrocyObject):
+    __slots__ = ('_location_id', '_product_group_id', '_qu_id_stock', '_qu_id_purchase',
+                 '_qu_factor_purchase_to_stock', '_picture_file_name', '_allow_partial_units_in_stock',
+                 '_min_stock_amount', '_default_best_before_days', '_userfields', '_price', '_barcodes')
+
     def __init__(self, parsed_json):
         super().__init__(parsed_json)
         self._location_id = parse_int(parsed_json.get('location_id', None))
@@ -79,13 +183,31 @@ class ProductData(GrocyObject):
         self._allow_partial_units_in_stock = bool(parsed_json.get('allow_partial_units_in_stock', None) == "true")
         self._min_stock_amount = parse_int(parsed_json.get('min_stock_amount', None), 0)
         self._default_best_before_days = parse_int(parsed_json.get('default_best_before_days', None))
-        self._userfields = {}
+        # Newer grocy versions return the userfields inline
+        self._set_userfields(parsed_json.get('userfields') or {})
 
         barcodes_raw = parsed_json.get('barcode', "")
         if barcodes_raw is None:
             self._barcodes = None
         else:
-            self._barcodes = barcodes_raw.split(",")
+            self._barcodes = tuple(barcodes_raw.split(","))
+
+    def to_json(self):
+        parsed_json = super().to_json()
+        parsed_json.update({
+            'location_id': self._location_id,
+            'product_group_id': self._product_group_id,
+            'qu_id_stock': self._qu_id_stock,
+            'qu_id_purchase': self._qu_id_purchase,
+            'qu_factor_purchase_to_stock': self._qu_factor_purchase_to_stock,
+            'picture_file_name': self._picture_file_name,
+            'allow_partial_units_in_stock': "true" if self._allow_partial_units_in_stock else "false",
+            'min_stock_amount': self._min_stock_amount,
+            'default_best_before_days': self._default_best_before_days,
+            'barcode': ",".join(self._barcodes) if self._barcodes is not None else None,
+            'userfields': self._userfields
+        })
+        return parsed_json
 
     @property
     def product_group_id(self) -> int:
@@ -104,20 +226,27 @@ class ProductData(GrocyObject):
         return self._picture_file_name
 
     @property
-    def barcodes(self) -> List[str]:
+    def barcodes(self) -> Tuple[str, ...]:
         return self._barcodes
 
     @property
     def userfields(self):
         return self._userfields
 
-    @userfields.setter
-    def userfields(self, value):
+    def _set_userfields(self, value):
         self._userfields = value
+        # Parse once, price is read on every shopping list update
+        self._price = parse_float(value.get('price'))
+
+    def with_userfields(self, value) -> 'ProductData':
+        '''Return a copy of the product with the given userfields'''
+        product = copy.copy(self)
+        product._set_userfields(value)
+        return product
 
     @property
     def price(self) -> float:
-        return parse_float(self._userfields['price'])
+        return self._price
 
     @property
     def store(self) -> str:
@@ -125,28 +254,50 @@ class ProductData(GrocyObject):
 
 
 class ShoppingList(GrocyObject):
+    __slots__ = ()
+
     def __init__(self, parsed_json):
         super().__init__(parsed_json)
 
 
 class LocationData(GrocyObject):
+    __slots__ = ('_is_freezer',)
+
     def __init__(self, parsed_json):
         super().__init__(parsed_json)
         self._is_freezer = parsed_json.get('is_freezer')
 
+    def to_json(self):
+        parsed_json = super().to_json()
+        parsed_json['is_freezer'] = self._is_freezer
+        return parsed_json
+
         
 class ProductGroupData(GrocyObject):
+    __slots__ = ()
+
     def __init__(self, parsed_json):
         super().__init__(parsed_json)
 
 
 class QuantityUnitData(GrocyObject):
+    __slots__ = ('_name_plural',)
+
     def __init__(self, parsed_json):
         super().__init__(parsed_json)
         self._name_plural = parsed_json.get('name_plural')
 
+    def to_json(self):
+        parsed_json = super().to_json()
+        parsed_json['name_plural'] = self._name_plural
+        return parsed_json
+
+
+class ProductDetailsResponse(GrocyModel):
+    __slots__ = ('_last_purchased', '_last_used', '_stock_amount', '_stock_amount_opened',
+                 '_next_best_before_date', '_last_price', '_product', '_quantity_unit_purchase',
+                 '_quantity_unit_stock', '_location')
 
-class ProductDetailsResponse(object):
     def __init__(self, parsed_json):
         self._last_purchased = parse_date(parsed_json.get('last_purchased'))
         self._last_used = parse_date(parsed_json.get('last_used'))
@@ -191,11 +342,21 @@ class ProductDetailsResponse(object):
         return self._product
 
 
-class GrocyApiClient(object):
-    def __init__(self, base_url, api_key, port: int = DEFAULT_PORT_NUMBER, verify_ssl = True):
+class BaseGrocyApiClient(object):
+    '''The grocy api calls, shared by the blocking and the asyncio clients
+
+    Every call builds its request once and hands it (with an optional parser of the
+    response) to _request, implemented by the subclasses. The asyncio client returns
+    coroutines, so the same methods are awaited there.
+    '''
+
+    def __init__(self, base_url, api_key, port: int = DEFAULT_PORT_NUMBER, verify_ssl = True,
+                 policy: TransportPolicy = None):
         self._base_url = '{}:{}/api/'.format(base_url, port)
         self._api_key = api_key
         self._verify_ssl = verify_ssl
+        self._policy = policy or DEFAULT_POLICY
+        self._inline_userfields = False
         if self._api_key == "demo_mode":
             self._headers = { "accept": "application/json" }
         else:
@@ -204,35 +365,10 @@ class GrocyApiClient(object):
                 "GROCY-API-KEY": api_key
             }
 
-    def _do_get_request(self, end_url: str):
-        req_url = urljoin(self._base_url, end_url)
-        resp = requests.get(req_url, verify=self._verify_ssl, headers=self._headers)
-        _LOGGER.debug(f"GET {req_url} {resp.status_code}")
-        resp.raise_for_status()
-        if len(resp.content) > 0:
-            return resp.json()
-
-    def _do_post_request(self, end_url: str, data):
-        req_url = urljoin(self._base_url, end_url)
-        resp = requests.post(req_url, verify=self._verify_ssl, headers=self._headers, data=data)
-        _LOGGER.debug(f"POST {req_url} {resp.status_code}")
-        resp.raise_for_status()
-        if len(resp.content) > 0:
-            return resp.json()
-
-    def _do_put_request(self, end_url: str, data):
-        req_url = urljoin(self._base_url, end_url)
-        resp = requests.put(req_url, verify=self._verify_ssl, headers=self._headers, data=data)
-        _LOGGER.debug(f"PUT {req_url} {resp.status_code}")
-        resp.raise_for_status()
-        if len(resp.content) > 0:
-            return resp.json()
-
-    def _do_delete_request(self, end_url: str):
-        req_url = urljoin(self._base_url, end_url)
-        resp = requests.delete(req_url, verify=self._verify_ssl, headers=self._headers)
-        _LOGGER.debug(f"DELETE {req_url} {resp.status_code}")
-        resp.raise_for_status()
+    @property
+    def inline_userfields(self) -> bool:
+        '''True when the last objects response already included the userfields'''
+        return self._inline_userfields
 
     def add_product(self, id, name, barcode, description, product_group_id,
                     qu_id_purchase, location_id, picture):
@@ -255,7 +391,7 @@ class GrocyApiClient(object):
             "tare_weight": "0.0",
             "not_check_stock_fulfillment_for_recipes": "0"
         }
-        self._do_post_request("objects/products", data=data)
+        return self._request("POST", "objects/products", data=data)
 
     def update_product(self, id, name = None, barcode = None, description = None,
                        product_group_id = None, qu_id_purchase = None, location_id = None,
@@ -267,73 +403,98 @@ class GrocyApiClient(object):
         if product_group_id: data['product_group_id'] = product_group_id
         if location_id: data['location_id'] = location_id
         if picture: data['picture'] = picture
-        self._do_put_request(f"objects/products/{id}", data=data)        
+        return self._request("PUT", f"objects/products/{id}", data=data)
 
     def add_product_group(self, id, name):
         data = {
             "id": id,
             "name": name
         }
-        self._do_post_request("objects/product_groups", data=data)
+        return self._request("POST", "objects/product_groups", data=data)
 
     def remove_objects_products(self, id):
-        self._do_delete_request(f"objects/products/{id}")
+        return self._request("DELETE", f"objects/products/{id}")
 
     def add_location(self, id, name):
         data = {
             "id": id,
             "name": name
         }
-        self._do_post_request("objects/locations", data=data)
+        return self._request("POST", "objects/locations", data=data)
 
     def add_quantity_unit(self, id, name):
         data = {
             "id": id,
             "name": name
         }
-        self._do_post_request("objects/quantity_units", data=data)
+        return self._request("POST", "objects/quantity_units", data=data)
 
     def add_shopping_list(self, id, name):
         data = {
             "id": id,
             "name": name
         }
-        self._do_post_request("objects/shopping_lists", data=data)
+        return self._request("POST", "objects/shopping_lists", data=data)
 
     def get_info(self):
-        return self._do_get_request("system/info")
+        return self._request("GET", "system/info")
+
+    def get_objects(self, entity: str, query = None, order: str = None, limit: int = None,
+                    offset: int = None, since = None, parse = None):
+        '''Return the rows of an objects table, filtered, ordered and paged by grocy
+
+        query is a list of conditions ("field=value", also !=, <, >, <=, >=, ~, !~),
+        order ("field[:asc|desc]") is applied with or without limit, since only returns rows
+        created after it (for incremental pulls), parse maps the rows.
+        '''
+        query = list(query or [])
+        if since is not None:
+            query.append(since_condition(since))
+
+        def parse_rows(parsed_json):
+            rows = apply_query(parsed_json or [], query, order, limit, offset)
+            return parse(rows) if parse else rows
+
+        return self._request("GET", f"objects/{entity}", params=build_query_params(query, order, limit, offset),
+                             parse=parse_rows)
+
+    @staticmethod
+    def _page_query(query, last_id):
+        # Keyset paging (id > last id) stays correct when grocy ignores the paging parameters
+        return list(query or []) + ([f"id>{last_id}"] if last_id is not None else [])
 
-    def get_locations(self) -> List[LocationData]:
-        parsed_json = self._do_get_request("objects/locations")
-        return [LocationData(response) for response in parsed_json]
+    def get_locations(self, query = None) -> List[LocationData]:
+        return self.get_objects("locations", query,
+                                parse=lambda rows: [LocationData(response) for response in rows])
 
-    def get_quantity_units(self) -> List[QuantityUnitData]:
-        parsed_json = self._do_get_request("objects/quantity_units")
-        return [QuantityUnitData(response) for response in parsed_json]
+    def get_quantity_units(self, query = None) -> List[QuantityUnitData]:
+        return self.get_objects("quantity_units", query,
+                                parse=lambda rows: [QuantityUnitData(response) for response in rows])
 
-    def get_shopping_lists(self) -> List[ShoppingList]:
-        parsed_json = self._do_get_request("objects/shopping_lists")
-        return [ShoppingList(response) for response in parsed_json]
+    def get_shopping_lists(self, query = None) -> List[ShoppingList]:
+        return self.get_objects("shopping_lists", query,
+                                parse=lambda rows: [ShoppingList(response) for response in rows])
 
-    def get_products(self) -> List[ProductData]:
-        parsed_json = self._do_get_request("objects/products")
-        return [ProductData(response) for response in parsed_json]
+    def get_products(self, query = None, since = None) -> List[ProductData]:
+        return self.get_objects("products", query, since=since, parse=self._parse_products)
 
-    def get_product_groups(self) -> List[ProductGroupData]:
-        parsed_json = self._do_get_request("objects/product_groups")
-        return [ProductGroupData(response) for response in parsed_json]
+    def _parse_products(self, rows) -> List[ProductData]:
+        self._inline_userfields = len(rows) > 0 and 'userfields' in rows[0]
+        return [ProductData(response) for response in rows]
+
+    def get_product_groups(self, query = None) -> List[ProductGroupData]:
+        return self.get_objects("product_groups", query,
+                                parse=lambda rows: [ProductGroupData(response) for response in rows])
 
     def get_product_by_barcode(self, barcode):
-        parsed_json = self._do_get_request(f"stock/products/by-barcode/{barcode}")
-        return ProductData(parsed_json['product'])
+        return self._request("GET", f"stock/products/by-barcode/{barcode}",
+                             parse=lambda parsed_json: ProductData(parsed_json['product']))
 
-    def get_shopping_list(self, shopping_list_id) -> List[ShoppingListItem]:
-        shopping_list_items = []
-        parsed_json = self._do_get_request("objects/shopping_list")
-        for response in parsed_json:
-            if response['shopping_list_id'] == str(shopping_list_id) or not shopping_list_id:
-                shopping_list_items.append(ShoppingListItem(response))
-        return shopping_list_items
+    def get_shopping_list(self, shopping_list_id, since = None) -> List[ShoppingListItem]:
+        # Filtered by grocy, and again here for versions without query support
+        query = [f"shopping_list_id={shopping_list_id}"] if shopping_list_id else []
+        return self.get_objects("shopping_list", query, since=since,
+                                parse=lambda rows: [ShoppingListItem(response) for response in rows])
 
     def add_product_to_shopping_list(self, product_id: int, shopping_list_id: int = 1, amount: int = 1):
         data = {
@@ -341,41 +502,170 @@ class GrocyApiClient(object):
             "list_id": shopping_list_id,
             "product_amount": amount
         }
-        self._do_post_request("stock/shoppinglist/add-product", data)
-            
+        return self._request("POST", "stock/shoppinglist/add-product", data=data)
+
     def remove_product_in_shopping_list(self, product_id: int, shopping_list_id: int = 1, amount: int = 1):
         data = {
             "product_id": product_id,
             "list_id": shopping_list_id,
             "product_amount": amount
         }
-        self._do_post_request("stock/shoppinglist/remove-product", data)
+        return self._request("POST", "stock/shoppinglist/remove-product", data=data)
 
     def clear_shopping_list(self, shopping_list_id: int = 1):
         data = {
             "list_id": shopping_list_id
         }
-        self._do_post_request("stock/shoppinglist/clear", data=data)
+        return self._request("POST", "stock/shoppinglist/clear", data=data)
 
     def complete_product_in_shopping_list(self, id: int, complete: int = 1):
         data = {
             "done": complete
         }
-        self._do_put_request(f"objects/shopping_list/{id}", data=data)
-        
+        return self._request("PUT", f"objects/shopping_list/{id}", data=data)
+
     def set_userfield(self, entity: str, object_id: int, key: str, value):
         data = {
             key: value
         }
-        self.set_userfields(entity, object_id, data)
+        return self.set_userfields(entity, object_id, data)
 
     def get_userfields(self, entity: str, object_id: int):
-        return self._do_get_request(f"userfields/{entity}/{object_id}")
+        return self._request("GET", f"userfields/{entity}/{object_id}")
 
     def set_userfields(self, entity: str, object_id: int, data):
-        self._do_put_request(f"userfields/{entity}/{object_id}", data)
+        return self._request("PUT", f"userfields/{entity}/{object_id}", data=data)
 
     def get_last_db_changed(self):
-        parsed_json = self._do_get_request("system/db-changed-time")
-        last_change_timestamp = parse_date(parsed_json.get('changed_time'))
-        return last_change_timestamp
\ No newline at end of file
+        return self._request("GET", "system/db-changed-time",
+                             parse=lambda parsed_json: parse_date(parsed_json.get('changed_time')))
+
+
+class GrocyApiClient(BaseGrocyApiClient):
+    '''Blocking grocy api client (requests)'''
+
+    def _do_request(self, method: str, end_url: str, data = None, params = None):
+        req_url = urljoin(self._base_url, end_url)
+
+        def request():
+            resp = requests.request(method, req_url, verify=self._verify_ssl, headers=self._headers,
+                                    data=data, params=params, timeout=self._policy.timeout)
+            _LOGGER.debug(f"{method} {req_url} {resp.status_code}")
+            resp.raise_for_status()
+            if len(resp.content) > 0:
+                return resp.json()
+
+        return self._policy.run(method, req_url, request)
+
+    def _request(self, method: str, end_url: str, data = None, params = None, parse = None):
+        parsed_json = self._do_request(method, end_url, data, params)
+        return parse(parsed_json) if parse else parsed_json
+
+    def iter_objects(self, entity: str, query = None, since = None, page_size: int = DEFAULT_PAGE_SIZE):
+        '''Yield the rows of an objects table page by page (ordered by id)'''
+        last_id = None
+        while True:
+            rows = self.get_objects(entity, self._page_query(query, last_id), 'id', page_size, since=since)
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+    def iter_userfields(self, entity: str, object_ids, concurrency: int = DEFAULT_USERFIELDS_CONCURRENCY):
+        '''Fetch userfields of many objects in parallel, yield (object_id, userfields) as they arrive'''
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(self.get_userfields, entity, object_id): object_id
+                       for object_id in object_ids}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
+class AsyncGrocyApiClient(BaseGrocyApiClient):
+    '''Asyncio grocy api client (aiohttp), on the given session or a keep-alive one of its own
+
+    At most pool_limit requests are in flight, whichever session is used.
+    '''
+
+    def __init__(self, base_url, api_key, port: int = DEFAULT_PORT_NUMBER, verify_ssl = True,
+                 session: aiohttp.ClientSession = None, pool_limit: int = DEFAULT_POOL_LIMIT,
+                 keepalive_timeout: int = DEFAULT_KEEPALIVE_TIMEOUT, policy: TransportPolicy = None):
+        super().__init__(base_url, api_key, port, verify_ssl, policy)
+        self._session = session
+        self._owns_session = session is None
+        self._pool_limit = pool_limit
+        self._keepalive_timeout = keepalive_timeout
+        # Bounds the requests in flight, also on a shared session whose pool isn't ours
+        self._semaphore = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session is created lazily so it is bound to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_limit, limit_per_host=self._pool_limit,
+                                             keepalive_timeout=self._keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        """Close the underlying session (only when owned by this client)"""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _do_request(self, method: str, end_url: str, data = None, params = None):
+        req_url = urljoin(self._base_url, end_url)
+        if data is not None:
+            # Same as requests, drop empty form fields
+            data = {key: value for key, value in data.items() if value is not None}
+
+        if self._semaphore is None:
+            # Created lazily so it is bound to the running event loop
+            self._semaphore = asyncio.Semaphore(self._pool_limit)
+
+        async def request():
+            async with self._semaphore, self._get_session().request(method, req_url, headers=self._headers, data=data,
+                                                   params=params, timeout=self._policy.client_timeout,
+                                                   ssl=None if self._verify_ssl else False) as resp:
+                _LOGGER.debug(f"{method} {req_url} {resp.status}")
+                resp.raise_for_status()
+                return await resp.read()
+
+        content = await self._policy.async_run(method, req_url, request)
+        if len(content) > 0:
+            return json.loads(content)
+
+    async def _request(self, method: str, end_url: str, data = None, params = None, parse = None):
+        parsed_json = await self._do_request(method, end_url, data, params)
+        return parse(parsed_json) if parse else parsed_json
+
+    async def iter_objects(self, entity: str, query = None, since = None, page_size: int = DEFAULT_PAGE_SIZE):
+        '''Yield the rows of an objects table page by page (ordered by id)'''
+        last_id = None
+        while True:
+            rows = await self.get_objects(entity, self._page_query(query, last_id), 'id', page_size, since=since)
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+    async def iter_userfields(self, entity: str, object_ids, concurrency: int = DEFAULT_USERFIELDS_CONCURRENCY):
+        '''Fetch userfields of many objects concurrently, yield (object_id, userfields) as they arrive'''
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(object_id):
+            async with semaphore:
+                return object_id, await self.get_userfields(entity, object_id)
+
+        tasks = [asyncio.ensure_future(fetch(object_id)) for object_id in object_ids]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
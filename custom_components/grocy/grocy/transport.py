@@ -0,0 +1,227 @@
+'''HTTP transport policy shared by the grocy and store clients'''
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 5
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30
+DEFAULT_HEDGE_WORKERS = 4
+
+# Safe to send twice
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class CircuitOpenError(Exception):
+    """Requests to a host are refused while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures, lets one request through after `reset` seconds."""
+
+    def __init__(self, threshold: int = DEFAULT_BREAKER_THRESHOLD, reset: float = DEFAULT_BREAKER_RESET):
+        """Initialize the class."""
+        self._threshold = threshold
+        self._reset = reset
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self._reset:
+                # Half open, the next result closes or reopens it
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self._threshold:
+                if self._opened_at is None:
+                    _LOGGER.warning(f"Circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+def is_retryable(error) -> bool:
+    """Return True for connection errors, timeouts and 5xx/429 responses (requests or aiohttp)."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout,
+                          aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return False
+
+
+class TransportPolicy:
+    """Timeouts, jittered retries of idempotent requests, a circuit breaker per host
+    and optional hedged GETs (a duplicate is sent when the first is slower than hedge_delay).
+
+    Clients pass the whole request (send, raise_for_status, read) as a callable,
+    the policy decides when to send it again.
+    """
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 breaker_reset: float = DEFAULT_BREAKER_RESET,
+                 hedge_delay: float = None):
+        """Initialize the class."""
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._retries = retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._breaker_threshold = breaker_threshold
+        self._breaker_reset = breaker_reset
+        self._hedge_delay = hedge_delay
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._hedge_executor = None
+
+    @property
+    def timeout(self):
+        """Return the (connect, read) timeout for requests."""
+        return (self._connect_timeout, self._read_timeout)
+
+    @property
+    def client_timeout(self) -> aiohttp.ClientTimeout:
+        """Return the timeout for aiohttp."""
+        return aiohttp.ClientTimeout(sock_connect=self._connect_timeout, sock_read=self._read_timeout)
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Return the circuit breaker of the url host."""
+        host = urlparse(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self._breaker_threshold, self._breaker_reset)
+            return breaker
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter, clients retrying together don't hit the backend together
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+
+    def _attempts(self, method: str) -> int:
+        return 1 + (self._retries if method.upper() in IDEMPOTENT_METHODS else 0)
+
+    def _hedged(self, method: str) -> bool:
+        return self._hedge_delay is not None and method.upper() == 'GET'
+
+    def run(self, method: str, url: str, request):
+        """Run a blocking request() under the policy, return its result."""
+        breaker = self.breaker(url)
+        attempts = self._attempts(method)
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(urlparse(url).netloc)
+            try:
+                result = self._run_hedged(request) if self._hedged(method) else request()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                _LOGGER.debug(f"{method} {url} failed ({type(e).__name__}), retry {attempt + 1}")
+                time.sleep(self._backoff(attempt))
+            else:
+                breaker.record_success()
+                return result
+
+    def _run_hedged(self, request):
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=DEFAULT_HEDGE_WORKERS)
+        futures = [self._hedge_executor.submit(request)]
+        done, _ = wait(futures, timeout=self._hedge_delay)
+        if not done:
+            futures.append(self._hedge_executor.submit(request))
+        # First success wins, an error counts only if both failed
+        pending = set(futures)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+            if not pending:
+                raise next(iter(done)).exception()
+
+    async def async_run(self, method: str, url: str, request):
+        """Run await request() under the policy, return its result."""
+        breaker = self.breaker(url)
+        attempts = self._attempts(method)
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(urlparse(url).netloc)
+            try:
+                if self._hedged(method):
+                    result = await self._async_run_hedged(request)
+                else:
+                    result = await request()
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                _LOGGER.debug(f"{method} {url} failed ({type(e).__name__}), retry {attempt + 1}")
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                breaker.record_success()
+                return result
+
+    async def _async_run_hedged(self, request):
+        tasks = [asyncio.ensure_future(request())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(request()))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+# Used by clients that are not given a policy
+DEFAULT_POLICY = TransportPolicy()
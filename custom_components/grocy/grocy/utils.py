@@ -7,6 +7,11 @@ def parse_date(input_value):
         return None
     return iso8601.parse_date(input_value)
 
+def format_date(input_value):
+    if input_value is None:
+        return None
+    return input_value.isoformat()
+
 def parse_int(input_value, default_value=None):
     if input_value is None:
         return default_value
@@ -0,0 +1,97 @@
+'''Shopping list price comparison across the online stores'''
+
+import asyncio
+import logging
+
+from .store import STORE_CLIENTS, get_store
+from .grocy.utils import parse_float
+
+from .const import DEFAULT_STORE_TIMEOUT, DEFAULT_STORE_CONCURRENCY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PriceComparison:
+    """Price a shopping list in every store and split it into the cheapest basket.
+
+    All stores are queried at the same time, each within its own timeout. Items a
+    store didn't price in time (or doesn't sell) are left out of its total.
+    """
+
+    def __init__(self, executor, timeout: float = DEFAULT_STORE_TIMEOUT,
+                 concurrency: int = DEFAULT_STORE_CONCURRENCY):
+        """Initialize the class."""
+        self._executor = executor
+        self._timeout = timeout
+        self._concurrency = concurrency
+
+    async def async_compare(self, items):
+        """Compare the prices of (product, amount) items, return the result as attributes."""
+        items = [(product, amount) for product, amount in items if product.barcodes]
+        stores = [get_store(store_class.name) for store_class in STORE_CLIENTS]
+        results = await asyncio.gather(*[self._async_price_store(store, items) for store in stores])
+        prices = dict(zip([store.name for store in stores], results))
+        return self._split(items, prices)
+
+    async def _async_price_store(self, store, items):
+        """Return {product id: unit price} of the items the store priced within the timeout."""
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def lookup(product):
+            barcode = product.barcodes[0]
+            hit, store_product = store.get_cached_product_by_barcode(barcode)
+            if not hit:
+                async with semaphore:
+                    store_product = await self._executor.async_run_blocking(store.get_product_by_barcode, barcode)
+            # Stores without prices report 0
+            price = parse_float(store_product.price) if store_product else None
+            return product.id, price or None
+
+        tasks = [asyncio.ensure_future(lookup(product)) for product, _ in items]
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks, timeout=self._timeout)
+        for task in pending:
+            # Lookups already running in the executor finish there (and fill the cache)
+            task.cancel()
+        if pending:
+            _LOGGER.debug(f"{store.name}: {len(pending)} of {len(tasks)} lookups timed out")
+        prices = {}
+        for task in done:
+            if task.exception() is not None:
+                _LOGGER.debug(f"{store.name} lookup failed ({type(task.exception()).__name__})")
+                continue
+            product_id, price = task.result()
+            if price is not None:
+                prices[product_id] = price
+        return prices
+
+    @staticmethod
+    def _split(items, prices):
+        store_totals = {}
+        basket = {}
+        basket_total = 0
+        unpriced = []
+        for product, amount in items:
+            offers = [(store_prices[product.id], store_name) for store_name, store_prices in prices.items()
+                      if product.id in store_prices]
+            for price, store_name in offers:
+                totals = store_totals.setdefault(store_name, {'total': 0, 'items': 0})
+                totals['total'] += price * amount
+                totals['items'] += 1
+            if not offers:
+                unpriced.append(product.name)
+                continue
+            price, store_name = min(offers)
+            basket.setdefault(store_name, {'total': 0, 'products': []})
+            basket[store_name]['total'] += price * amount
+            basket[store_name]['products'].append(product.name)
+            basket_total += price * amount
+        for entry in list(store_totals.values()) + list(basket.values()):
+            entry['total'] = round(entry['total'], 2)
+        return {
+            'store_totals': store_totals,
+            'cheapest_basket': basket,
+            'cheapest_basket_total': round(basket_total, 2),
+            'unpriced': unpriced
+        }
@@ -0,0 +1,115 @@
+'''Store price refresh of the grocy products'''
+
+import asyncio
+import logging
+
+from .store import get_store
+from .write_queue import userfield_op
+from .grocy.utils import parse_float
+
+from .const import (DOMAIN_EVENT, EVENT_SYNC_PROGRESS,
+                    DEFAULT_STORE_RATE_LIMIT, DEFAULT_STORE_CONCURRENCY, DEFAULT_PROGRESS_STEP)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """At most `concurrency` calls in flight, started at most `rate` times a second."""
+
+    def __init__(self, loop, rate: float = DEFAULT_STORE_RATE_LIMIT,
+                 concurrency: int = DEFAULT_STORE_CONCURRENCY):
+        """Initialize the class."""
+        self._loop = loop
+        self._interval = 1 / rate
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._lock = asyncio.Lock()
+        self._next_start = 0
+
+    async def async_run(self, func):
+        """Run func (a coroutine function) once a slot is free."""
+        async with self._semaphore:
+            async with self._lock:
+                delay = self._next_start - self._loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._next_start = self._loop.time() + self._interval
+            return await func()
+
+
+class PriceRefresh:
+    """Look up the products in their stores and queue the prices that changed.
+
+    Products are grouped by store: one client and one rate limit per store, all
+    stores run concurrently. Cached lookups are not rate limited.
+    """
+
+    def __init__(self, hass, executor, write_queue,
+                 rate: float = DEFAULT_STORE_RATE_LIMIT,
+                 concurrency: int = DEFAULT_STORE_CONCURRENCY):
+        """Initialize the class."""
+        self._hass = hass
+        self._executor = executor
+        self._write_queue = write_queue
+        self._rate = rate
+        self._concurrency = concurrency
+        self._total = 0
+        self._done = 0
+        self._reported = 0
+
+    async def async_run(self, products) -> int:
+        """Refresh the prices of products, return the number of prices that changed."""
+        by_store = {}
+        for product in products:
+            store_name = product.userfields.get('store')
+            if store_name and product.barcodes:
+                by_store.setdefault(store_name, []).append(product)
+        self._total = sum(len(store_products) for store_products in by_store.values())
+        self._done = 0
+        self._reported = 0
+        results = await asyncio.gather(*[self._async_refresh_store(store_name, store_products)
+                                         for store_name, store_products in by_store.items()])
+        ops = [op for store_ops in results for op in store_ops]
+        _LOGGER.debug(f"{len(ops)} of {self._total} prices changed")
+        if ops:
+            # Written as one batch through the write queue
+            await self._write_queue.async_submit(ops)
+        return len(ops)
+
+    async def _async_refresh_store(self, store_name: str, products):
+        store = get_store(store_name)
+        limiter = RateLimiter(self._hass.loop, self._rate, self._concurrency)
+
+        async def lookup(product):
+            barcode = product.barcodes[0]
+            try:
+                hit, store_product = store.get_cached_product_by_barcode(barcode)
+                if not hit:
+                    store_product = await limiter.async_run(
+                        lambda: self._executor.async_run_blocking(store.get_product_by_barcode, barcode))
+            except Exception as e:
+                _LOGGER.debug(f"Price lookup of {barcode} at {store_name} failed ({type(e).__name__})")
+                store_product = None
+            finally:
+                self._progress()
+            # Stores without prices report 0
+            price = parse_float(store_product.price) if store_product else None
+            if not price:
+                return None
+            if product.price is not None and round(product.price, 2) == round(price, 2):
+                return None
+            return userfield_op('products', product.id, 'price', price)
+
+        ops = await asyncio.gather(*[lookup(product) for product in products])
+        return [op for op in ops if op is not None]
+
+    def _progress(self):
+        self._done += 1
+        # Reported every DEFAULT_PROGRESS_STEP percent (and when done)
+        percent = self._done * 100 // self._total
+        if percent - self._reported >= DEFAULT_PROGRESS_STEP or self._done == self._total:
+            self._reported = percent
+            self._hass.bus.async_fire(DOMAIN_EVENT, {
+                "event": EVENT_SYNC_PROGRESS,
+                "done": self._done,
+                "total": self._total
+            })
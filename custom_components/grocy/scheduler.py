@@ -0,0 +1,95 @@
+'''Adaptive, change driven grocy polling'''
+
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import (DEFAULT_MIN_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL, DEFAULT_POLL_BACKOFF)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ChangeScheduler:
+    """Poll grocy db-changed-time and refresh only when it moves (or local data is outdated).
+
+    Polls fast right after a local write or a detected change, and backs off
+    exponentially (up to max_interval) while the database is idle.
+    """
+
+    def __init__(self, hass, client, data,
+                 min_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                 backoff: float = DEFAULT_POLL_BACKOFF):
+        """Initialize the class."""
+        self._hass = hass
+        self._client = client
+        self._data = data
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._interval = min_interval
+        self._last_db_changed = None
+        self._unsub = None
+        self._polling = False
+        self._written = False
+        self._stopped = True
+
+    @property
+    def interval(self) -> float:
+        """Return the current poll interval (seconds)."""
+        return self._interval
+
+    @callback
+    def async_start(self, db_changed = None):
+        """Start polling, db_changed is the timestamp the current data was fetched at."""
+        self._last_db_changed = db_changed
+        self._stopped = False
+        self._schedule(self._min_interval)
+
+    @callback
+    def async_stop(self, event = None):
+        """Stop polling."""
+        self._stopped = True
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def async_notify_write(self):
+        """A local write was made, poll fast again."""
+        self._interval = self._min_interval
+        self._written = True
+        if not self._polling and not self._stopped:
+            self._schedule(self._min_interval)
+
+    def _schedule(self, delay: float):
+        if self._stopped:
+            return
+        if self._unsub:
+            self._unsub()
+        self._unsub = async_call_later(self._hass, delay, self._async_poll)
+
+    async def _async_poll(self, now = None):
+        """Check db-changed-time, refresh everything if it moved."""
+        self._unsub = None
+        self._polling = True
+        self._written = False
+        try:
+            db_changed = await self._client.get_last_db_changed()
+            # Local (optimistic) changes are reconciled even if the write never reached grocy
+            if db_changed != self._last_db_changed or self._data.outdated:
+                _LOGGER.debug(f"Grocy changed at {db_changed}, refreshing")
+                # Known userfields are kept, a forced sync reloads them. Only entities whose data
+                # changed are updated.
+                await self._data.async_update_data()
+                self._last_db_changed = db_changed
+                self._interval = self._min_interval
+            elif not self._written:
+                self._interval = min(self._interval * self._backoff, self._max_interval)
+        except Exception as e:
+            _LOGGER.debug(f"Grocy poll failed ({type(e).__name__})")
+            self._interval = min(self._interval * self._backoff, self._max_interval)
+        finally:
+            self._polling = False
+            self._schedule(self._interval)
@@ -10,14 +10,16 @@ from .const import (DOMAIN,
                     CONF_APIKEY, CONF_AMOUNT, CONF_SHOPPING_LIST_ID,
                     CONF_BARCODE, CONF_STORE, CONF_PRODUCT_GROUP_ID,
                     CONF_NAME, CONF_VALUE,
-                    CONF_PRODUCT_LOCATION_ID, CONF_PRODUCT_DESCRIPTION,
+                    CONF_PRODUCT_LOCATION_ID, CONF_PRODUCT_DESCRIPTION, CONF_MAX_CONNECTIONS, CONF_HEDGE_DELAY,
                     DEFAULT_AMOUNT, DEFAULT_SHOPPING_LIST_ID, DEFAULT_STORE,
-                    DEFAULT_PRODUCT_DESCRIPTION)
+                    DEFAULT_PRODUCT_DESCRIPTION, DEFAULT_MAX_CONNECTIONS)
 
 CONFIG_SCHEMA = vol.Schema({
     DOMAIN: vol.Schema({
         vol.Required(CONF_HOST): cv.string,
         vol.Required(CONF_APIKEY): cv.string,
+        vol.Optional(CONF_MAX_CONNECTIONS, default=DEFAULT_MAX_CONNECTIONS): cv.positive_int,
+        vol.Optional(CONF_HEDGE_DELAY): vol.Coerce(float),
         vol.Optional(CONF_STORE): vol.Schema({
             vol.Required(CONF_NAME): cv.string,
             vol.Required(CONF_USERNAME): cv.string,
@@ -56,4 +58,8 @@ REMOVE_FAVORITE_SERVICE_SCHEMA = vol.Schema({
 
 REMOVE_PRODUCT_SERVICE_SCHEMA = vol.Schema({
     vol.Required(CONF_ENTITY_ID): cv.entity_ids
+})
+
+COMPARE_PRICES_SERVICE_SCHEMA = vol.Schema({
+    vol.Optional(CONF_SHOPPING_LIST_ID, default=DEFAULT_SHOPPING_LIST_ID): cv.positive_int
 })
\ No newline at end of file
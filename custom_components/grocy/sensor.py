@@ -7,9 +7,9 @@ from datetime import timedelta
 from homeassistant.helpers.entity import Entity, async_generate_entity_id
 from homeassistant.components.sensor import ENTITY_ID_FORMAT
 
-from .const import (DOMAIN, DOMAIN_DATA, DATA_ENTITIES,
-                    PRODUCTS_NAME, SHOPPING_LISTS_NAME, SHOPPING_LIST_NAME, LOCATIONS_NAME,
-                    QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME)
+from .const import (DOMAIN, DOMAIN_DATA, DATA_ENTITIES, DATA_CATALOG, DATA_EXECUTOR,
+                    DATA_PRICE_COMPARISON,
+                    PRODUCTS_NAME, SHOPPING_LISTS_NAME)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,13 +22,30 @@ async def async_setup_platform(hass, config, async_add_entities, discovery_info=
     # Save it to enable adding products via service
     GrocySensorEntity.async_add_entities = async_add_entities
 
-    for product in hass.data[DOMAIN_DATA][PRODUCTS_NAME]:
-        hass.add_job(ProductSensor(hass, product).async_add())
-
-    for shopping_list in hass.data[DOMAIN_DATA][SHOPPING_LISTS_NAME]:
-        hass.add_job(ShoppingListSensor(hass, shopping_list).async_add())
-
-    hass.add_job(GrocySensor(hass).async_add())
+    entities = [ProductSensor(hass, product) for product in hass.data[DOMAIN_DATA][PRODUCTS_NAME]]
+    entities += [ShoppingListSensor(hass, shopping_list)
+                 for shopping_list in hass.data[DOMAIN_DATA][SHOPPING_LISTS_NAME]]
+    entities.append(GrocySensor(hass))
+    GrocySensorEntity.async_add_batch(hass, entities)
+
+
+def async_update_product_sensors(hass):
+    """Add sensors for new products and remove the ones of products no longer in grocy."""
+    if GrocySensorEntity.async_add_entities is None:
+        # Platform not set up yet, it creates the sensors from the current data
+        return
+    domain_data = hass.data[DOMAIN_DATA]
+    entities = domain_data[DATA_ENTITIES]
+    missing = [ProductSensor(hass, product) for product in domain_data[PRODUCTS_NAME]
+               if not entities.is_exists(ProductSensor.to_entity_id(product.id))]
+    _LOGGER.debug(f"Sync add {len(missing)} products")
+    GrocySensorEntity.async_add_batch(hass, missing)
+    # Remove floating products
+    for entity in entities.async_get_all_by_class_name('ProductSensor'):
+        if not domain_data[DATA_CATALOG].has_product(entity.product_id):
+            hass.add_job(entity.async_remove)
+            entities.async_remove(entity.entity_id)
+            _LOGGER.debug(f"Remove product: {entity.entity_id}")
 
 
 class GrocySensorEntity(Entity):
@@ -40,10 +57,27 @@ class GrocySensorEntity(Entity):
 
     async def async_add(self, update=True):
         """Add this entity"""
-        # Add it to the integration entity registry
-        self._hass.data[DOMAIN_DATA][DATA_ENTITIES].async_add(self, True)
-        # Add it to HA
-        self.async_add_entities([self], update)
+        GrocySensorEntity.async_add_batch(self._hass, [self])
+
+    @staticmethod
+    def async_add_batch(hass, entities):
+        """Add many entities at once, initial state is computed from the current snapshot"""
+        if not entities:
+            return
+        # Add them to the integration entity registry
+        hass.data[DOMAIN_DATA][DATA_ENTITIES].async_add_many(entities)
+        for entity in entities:
+            entity.update_from_snapshot()
+        # Add them to HA with a single call, no update needed
+        GrocySensorEntity.async_add_entities(entities, False)
+
+    def update_from_snapshot(self) -> None:
+        """Compute state from the data in DOMAIN_DATA."""
+        pass
+
+    async def async_update(self) -> None:
+        """Fetch new state data for the sensor."""
+        self.update_from_snapshot()
 
     @property
     def name(self):
@@ -77,6 +111,7 @@ class ProductSensor(GrocySensorEntity):
         self._attributes = {}
         self._entity_picture = product.picture_file_name
         self._product_id = product.id
+        self._barcodes = product.barcodes or ()
         self._icon = 'mdi:cart-outline'
         self.entity_id = self.to_entity_id(product.id)
 
@@ -85,50 +120,45 @@ class ProductSensor(GrocySensorEntity):
         """Return the picture of the sensor."""
         return self._entity_picture
 
+    @property
+    def product_id(self):
+        """Return the grocy product id."""
+        return self._product_id
+
+    @property
+    def barcodes(self):
+        """Return the product barcodes."""
+        return self._barcodes
+
     @property
     def should_poll(self):
         return False
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    def update_from_snapshot(self) -> None:
+        """Compute state from the data in DOMAIN_DATA."""
         _LOGGER.debug(f"Update product: {self._name}")
+        catalog = self._hass.data[DOMAIN_DATA][DATA_CATALOG]
         # Get the grocy product
-        for product in self.hass.data[DOMAIN_DATA][PRODUCTS_NAME]:
-            if product.id == self._product_id:
-                break
+        product = catalog.get_product(self._product_id)
         if not product:
             return
+        # Keep the barcode index in sync
+        if (product.barcodes or ()) != self._barcodes:
+            self._barcodes = product.barcodes or ()
+            self._hass.data[DOMAIN_DATA][DATA_ENTITIES].async_reindex(self)
         # Update state (amount)
-        self._state = 0
-        for item in self.hass.data[DOMAIN_DATA][SHOPPING_LIST_NAME]:
-            if item.product_id == product.id:
-                self._state = item.amount
-                break
-        # Set attributes (remove leading '_')
-        product_attributes = vars(product)
-        for key in product_attributes.keys():
-            self._attributes[key[1:]] = product_attributes[key]
-        # Flatten userfields
-        userfields = self._attributes['userfields']
-        for key in userfields.keys():
-            self._attributes[key] = userfields[key]
-        del self._attributes['userfields']
+        items = catalog.get_product_items(product.id)
+        self._state = items[0].amount if items else 0
+        # Set attributes, flatten userfields
+        self._attributes = product.as_dict()
+        self._attributes.update(self._attributes.pop('userfields'))
         # Update extra attributes
-        self._attributes['product_group_name'] = 'Other'
-        self._attributes['location_name'] = 'Other'
-        self._attributes['qu_purchase_name'] = 'Other'
-        for item in self.hass.data[DOMAIN_DATA][PRODUCT_GROUPS_NAME]:
-            if item.id == product.product_group_id:
-                self._attributes['product_group_name'] = item.name
-                break
-        for item in self.hass.data[DOMAIN_DATA][LOCATIONS_NAME]:
-            if item.id == product.location_id:
-                self._attributes['location_name'] = item.name
-                break
-        for item in self.hass.data[DOMAIN_DATA][QUANTITY_UNITS_NAME]:
-            if item.id == product.qu_id_purchase:
-                self._attributes['qu_purchase_name'] = item.name
-                break
+        product_group = catalog.get_product_group(product.product_group_id)
+        location = catalog.get_location(product.location_id)
+        quantity_unit = catalog.get_quantity_unit(product.qu_id_purchase)
+        self._attributes['product_group_name'] = product_group.name if product_group else 'Other'
+        self._attributes['location_name'] = location.name if location else 'Other'
+        self._attributes['qu_purchase_name'] = quantity_unit.name if quantity_unit else 'Other'
 
     @staticmethod
     def to_entity_id(id):
@@ -154,20 +184,16 @@ class ShoppingListSensor(GrocySensorEntity):
     def should_poll(self):
         return False
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    def update_from_snapshot(self) -> None:
+        """Compute state from the data in DOMAIN_DATA."""
         _LOGGER.debug(f"Update shopping list: {self._name}")
-        self._state = 0
-        self._attributes['total_amount'] = 0
-        self._attributes['total_price'] = 0
-        for item in self.hass.data[DOMAIN_DATA][SHOPPING_LIST_NAME]:
-            if item.shopping_list_id == self._shopping_list_id:
-                self._state += 1
-                self._attributes['total_amount'] += item.amount
-                for product in self.hass.data[DOMAIN_DATA][PRODUCTS_NAME]:
-                    if product.id == item.product_id:
-                        self._attributes['total_price'] += (product.price * item.amount)
-                        break
+        totals = self._hass.data[DOMAIN_DATA][DATA_CATALOG].get_shopping_list_totals(self._shopping_list_id)
+        self._state = totals.count
+        self._attributes.update(totals.as_attributes())
+        # Set by the compare_prices service
+        comparison = self._hass.data[DOMAIN_DATA][DATA_PRICE_COMPARISON].get(self._shopping_list_id)
+        if comparison:
+            self._attributes.update(comparison)
 
     @staticmethod
     def to_entity_id(id):
@@ -177,6 +203,7 @@ class ShoppingListSensor(GrocySensorEntity):
 
 class GrocySensor(GrocySensorEntity):
     """Grocy sensor class."""
+    ENTITY_ID = 'sensor.grocy'
 
     def __init__(self, hass) -> None:
         super().__init__(hass)
@@ -187,9 +214,11 @@ class GrocySensor(GrocySensorEntity):
         }
         self._name = 'Grocy'
         self._icon = 'mdi:cart'
+        self.entity_id = self.ENTITY_ID
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
+    def update_from_snapshot(self) -> None:
+        """Compute state from the data in DOMAIN_DATA."""
         # _LOGGER.debug("Update grocy sensor")
         self._state = 'connected'
-        self._attributes['total_products'] = len(self.hass.data[DOMAIN_DATA][DATA_ENTITIES].async_get_all_by_class_name('ProductSensor'))
\ No newline at end of file
+        self._attributes['total_products'] = self._hass.data[DOMAIN_DATA][DATA_ENTITIES].async_count_by_class_name('ProductSensor')
+        self._attributes.update(self._hass.data[DOMAIN_DATA][DATA_EXECUTOR].as_attributes())
\ No newline at end of file
@@ -9,13 +9,17 @@ from homeassistant.core import callback
 from homeassistant.const import (CONF_HOST, CONF_SCAN_INTERVAL, CONF_ENTITY_ID,
                                  CONF_USERNAME, CONF_PASSWORD)
 
-from .store import get_store
+from .store import get_store, StoreApiClient
 
-from .sensor import ProductSensor, ShoppingListSensor
-from .utils import contains
+from .write_queue import shopping_list_op
+from .price_refresh import PriceRefresh
+from .price_compare import PriceComparison
+from .sensor import (GrocySensorEntity, GrocySensor, ProductSensor, ShoppingListSensor,
+                     async_update_product_sensors)
 
 from .const import (DOMAIN, DOMAIN_DATA, DOMAIN_EVENT,
-                    DATA_GROCY, DATA_DATA, DATA_ENTITIES, DATA_STORE_CONF,
+                    DATA_GROCY, DATA_DATA, DATA_ENTITIES, DATA_STORE_CONF, DATA_CATALOG, DATA_SCHEDULER,
+                    DATA_WRITE_QUEUE, DATA_EXECUTOR, DATA_PRICE_COMPARISON,
                     CONF_AMOUNT, CONF_SHOPPING_LIST_ID,
                     CONF_BARCODE, CONF_STORE, CONF_PRODUCT_GROUP_ID, CONF_UNIT_OF_MEASUREMENT,
                     CONF_PRODUCT_LOCATION_ID, CONF_PRODUCT_DESCRIPTION, CONF_NAME,
@@ -23,79 +27,93 @@ from .const import (DOMAIN, DOMAIN_DATA, DOMAIN_EVENT,
                     ADD_TO_LIST_SERVICE, SUBTRACT_FROM_LIST_SERVICE,
                     ADD_PRODUCT_SERVICE, REMOVE_PRODUCT_SERVICE,
                     ADD_FAVORITE_SERVICE, REMOVE_FAVORITE_SERVICE,
-                    FILL_CART_SERVICE, EMPTY_CART_SERVICE,
+                    FILL_CART_SERVICE, EMPTY_CART_SERVICE, COMPARE_PRICES_SERVICE,
                     PRODUCTS_NAME, SHOPPING_LIST_NAME,
                     EVENT_ADDED_TO_LIST, EVENT_SUBTRACT_FROM_LIST, EVENT_PRODUCT_ADDED,
-                    EVENT_PRODUCT_REMOVED, EVENT_PRODUCT_UPDATED, EVENT_SYNC_DONE, EVENT_GROCY_ERROR)
+                    EVENT_PRODUCT_REMOVED, EVENT_PRODUCT_UPDATED, EVENT_SYNC_DONE, EVENT_GROCY_ERROR,
+                    EVENT_CART_SYNCED, EVENT_PRICES_COMPARED)
 from .schema import (CONFIG_SCHEMA,
                     ADD_TO_LIST_SERVICE_SCHEMA, SUBTRACT_FROM_LIST_SERVICE_SCHEMA,
                     ADD_PRODUCT_SERVICE_SCHEMA, REMOVE_PRODUCT_SERVICE_SCHEMA,
-                    ADD_FAVORITE_SERVICE_SCHEMA, REMOVE_FAVORITE_SERVICE_SCHEMA)
+                    ADD_FAVORITE_SERVICE_SCHEMA, REMOVE_FAVORITE_SERVICE_SCHEMA,
+                    COMPARE_PRICES_SERVICE_SCHEMA)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Executor keys of calls that are not about a single product
+CART_KEY = 'cart'
+SYNC_KEY = 'sync'
+PRICES_KEY = 'prices'
+
 
 def setup_services(hass):
 
     @callback
     def handle_add_to_list_service(call):
-        hass.async_add_job(async_add_to_list(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_add_to_list(hass, call.data), _product_keys(hass, call.data)))
     hass.services.async_register(
         DOMAIN, ADD_TO_LIST_SERVICE, handle_add_to_list_service, schema=ADD_TO_LIST_SERVICE_SCHEMA
         )
 
     @callback
     def handle_subtract_from_list_service(call):
-        hass.async_add_job(async_subtract_from_list(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_subtract_from_list(hass, call.data), _product_keys(hass, call.data)))
     hass.services.async_register(
         DOMAIN, SUBTRACT_FROM_LIST_SERVICE, handle_subtract_from_list_service, schema=SUBTRACT_FROM_LIST_SERVICE_SCHEMA
         )
 
     @callback
     def handle_add_product_service(call):
-        hass.async_add_job(async_add_product(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_add_product(hass, call.data), _barcode_key(hass, call.data[CONF_BARCODE])))
     hass.services.async_register(
         DOMAIN, ADD_PRODUCT_SERVICE, handle_add_product_service, schema=ADD_PRODUCT_SERVICE_SCHEMA
         )
 
     @callback
     def handle_remove_product_service(call):
-        hass.async_add_job(async_remove_product(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_remove_product(hass, call.data), _product_keys(hass, call.data)))
     hass.services.async_register(
         DOMAIN, REMOVE_PRODUCT_SERVICE, handle_remove_product_service, schema=REMOVE_PRODUCT_SERVICE_SCHEMA
         )
 
     @callback
     def handle_add_favorite_service(call):
-        hass.async_add_job(async_add_favorite(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_add_favorite(hass, call.data), _product_keys(hass, call.data)))
     hass.services.async_register(
         DOMAIN, ADD_FAVORITE_SERVICE, handle_add_favorite_service, schema=ADD_FAVORITE_SERVICE_SCHEMA
         )
 
     @callback
     def handle_remove_favorite_service(call):
-        hass.async_add_job(async_remove_favorite(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_remove_favorite(hass, call.data), _product_keys(hass, call.data)))
     hass.services.async_register(
         DOMAIN, REMOVE_FAVORITE_SERVICE, handle_remove_favorite_service, schema=REMOVE_FAVORITE_SERVICE_SCHEMA
         )
 
     @callback
     def handle_fill_cart_service(call):
-        hass.async_add_job(async_fill_cart(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_fill_cart(hass, call.data), CART_KEY))
     hass.services.async_register(
         DOMAIN, FILL_CART_SERVICE, handle_fill_cart_service
         )
 
     @callback
     def handle_empty_cart_service(call):
-        hass.async_add_job(async_empty_cart(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_empty_cart(hass, call.data), CART_KEY))
     hass.services.async_register(
         DOMAIN, EMPTY_CART_SERVICE, handle_empty_cart_service
         )
 
+    @callback
+    def handle_compare_prices_service(call):
+        hass.async_add_job(_async_run(hass, async_compare_prices(hass, call.data), PRICES_KEY))
+    hass.services.async_register(
+        DOMAIN, COMPARE_PRICES_SERVICE, handle_compare_prices_service, schema=COMPARE_PRICES_SERVICE_SCHEMA
+        )
+
     @callback
     def handle_sync_service(call):
-        hass.async_add_job(async_sync(hass, call.data))
+        hass.async_add_job(_async_run(hass, async_sync(hass, call.data), SYNC_KEY))
     hass.services.async_register(
         DOMAIN, SYNC_SERVICE, handle_sync_service
         )
@@ -108,51 +126,99 @@ def setup_services(hass):
         )
 
 
-async def async_add_to_list(hass, data):
+def _product_keys(hass, data):
+    """Return the product entity ids a call is about (calls for the same product run in order)."""
     domain_data = hass.data[DOMAIN_DATA]
-    try:
-        # Can be product or barcode sensor
-        entity_id = data[CONF_ENTITY_ID][0]
+    keys = []
+    for entity_id in data[CONF_ENTITY_ID]:
+        if not domain_data[DATA_ENTITIES].is_exists(entity_id):
+            # Barcode sensor
+            barcode = hass.states.get(entity_id)
+            entity = domain_data[DATA_ENTITIES].async_get_by_barcode(barcode.state) if barcode else None
+            if entity:
+                entity_id = entity.entity_id
+        keys.append(entity_id)
+    return keys
+
+
+def _barcode_key(hass, barcode):
+    """Return the entity id of the product with barcode (the barcode itself for a new product)."""
+    entity = hass.data[DOMAIN_DATA][DATA_ENTITIES].async_get_by_barcode(barcode)
+    return entity.entity_id if entity else barcode
+
+
+async def _async_get_product_entities(hass, entity_ids):
+    """Return the product entities of product or barcode sensors (unknown ones are skipped)."""
+    domain_data = hass.data[DOMAIN_DATA]
+    entities = {}
+    for entity_id in entity_ids:
         entity = domain_data[DATA_ENTITIES].async_get(entity_id)
         if not entity:
             barcode = hass.states.get(entity_id)
             if barcode:
-                product = domain_data[DATA_GROCY].get_product_by_barcode(barcode.state)
-                if product:
-                    entity_id = 'sensor.product' + str(product.id)
-                    entity = domain_data[DATA_ENTITIES].async_get(entity_id)
-        domain_data[DATA_GROCY].add_product_to_shopping_list(entity.device_state_attributes['id'], data[CONF_SHOPPING_LIST_ID], data[CONF_AMOUNT])
-        await domain_data[DATA_DATA].async_update_data([SHOPPING_LIST_NAME], True)
-        entity.async_schedule_update_ha_state(True)
-        shopping_list_entity_id = domain_data[DATA_ENTITIES].async_get(ShoppingListSensor.to_entity_id(data[CONF_SHOPPING_LIST_ID]))
-        shopping_list_entity_id.async_schedule_update_ha_state(True)    
-        hass.bus.fire(DOMAIN_EVENT, {
-            "event": EVENT_ADDED_TO_LIST,
-            "entity_id": entity_id,
-        })
+                # Known barcodes are resolved locally (works while grocy is unreachable)
+                entity = domain_data[DATA_ENTITIES].async_get_by_barcode(barcode.state)
+                if not entity:
+                    product = await domain_data[DATA_GROCY].get_product_by_barcode(barcode.state)
+                    if product:
+                        entity = domain_data[DATA_ENTITIES].async_get(ProductSensor.to_entity_id(product.id))
+        if entity:
+            entities[entity.entity_id] = entity
+        else:
+            _LOGGER.warning(f"Unknown product {entity_id}")
+    return list(entities.values())
+
+
+async def _async_change_shopping_list(hass, data, sign: int):
+    """Add (sign=1) or subtract (sign=-1) the amount of every product in the call, return the entity ids."""
+    domain_data = hass.data[DOMAIN_DATA]
+    entities = await _async_get_product_entities(hass, data[CONF_ENTITY_ID])
+    if not entities:
+        return []
+    shopping_list_id = data[CONF_SHOPPING_LIST_ID]
+    deltas = [(entity.product_id, shopping_list_id, sign * data[CONF_AMOUNT]) for entity in entities]
+    # Shown right away, grocy's list is fetched again once the scheduler sees the write
+    domain_data[DATA_DATA].async_apply_shopping_list_deltas(deltas)
+    # Queued (sent concurrently), replayed later if grocy is unreachable
+    await domain_data[DATA_WRITE_QUEUE].async_submit([shopping_list_op(*delta) for delta in deltas])
+    return [entity.entity_id for entity in entities]
+
+
+async def _async_run(hass, coro, key):
+    """Run a service call through the executor, then publish the queue metrics."""
+    domain_data = hass.data[DOMAIN_DATA]
+    try:
+        await domain_data[DATA_EXECUTOR].async_run(coro, key)
+    finally:
+        domain_data[DATA_ENTITIES].async_schedule_update_ha_state(GrocySensor.ENTITY_ID)
+
+
+async def async_add_to_list(hass, data):
+    try:
+        # Can be product or barcode sensors
+        entity_ids = await _async_change_shopping_list(hass, data, 1)
+        if entity_ids:
+            hass.bus.fire(DOMAIN_EVENT, {
+                "event": EVENT_ADDED_TO_LIST,
+                "entity_id": entity_ids[0],
+                "entity_ids": entity_ids
+            })
     except Exception as e:
         _LOGGER.error(f"Failed to add product ({type(e).__name__})")
         _LOGGER.debug(e)
 
 
 async def async_subtract_from_list(hass, data):
-    domain_data = hass.data[DOMAIN_DATA]
     try:
-        # Can be product or barcode sensor
-        entity_id = data[CONF_ENTITY_ID][0]
-        entity = domain_data[DATA_ENTITIES].async_get(entity_id)
-        resp = domain_data[DATA_GROCY].remove_product_in_shopping_list(
-            entity.device_state_attributes['id'], data[CONF_SHOPPING_LIST_ID], data[CONF_AMOUNT]
-            )
-        _LOGGER.debug(f"Product was subtarcted from list {entity_id}")
-        await domain_data[DATA_DATA].async_update_data([SHOPPING_LIST_NAME], True)
-        entity.async_schedule_update_ha_state(True)
-        shopping_list_entity_id = domain_data[DATA_ENTITIES].async_get(ShoppingListSensor.to_entity_id(data[CONF_SHOPPING_LIST_ID]))
-        shopping_list_entity_id.async_schedule_update_ha_state(True)
-        hass.bus.fire(DOMAIN_EVENT, {
-            "event": EVENT_SUBTRACT_FROM_LIST,
-            "entity_id": entity_id
-        })
+        # Can be product or barcode sensors
+        entity_ids = await _async_change_shopping_list(hass, data, -1)
+        if entity_ids:
+            _LOGGER.debug(f"Products were subtarcted from list {entity_ids}")
+            hass.bus.fire(DOMAIN_EVENT, {
+                "event": EVENT_SUBTRACT_FROM_LIST,
+                "entity_id": entity_ids[0],
+                "entity_ids": entity_ids
+            })
     except Exception as e:
         _LOGGER.error(f"Failed to subtarct product ({type(e).__name__})")
         _LOGGER.debug(e)
@@ -166,8 +232,9 @@ async def async_add_product(hass, data):
         if entity:
             _LOGGER.debug(f"Update product")
             id = entity.device_state_attributes['id']
-            domain_data[DATA_GROCY].update_product(id, product_group_id = data[CONF_PRODUCT_GROUP_ID],
+            await domain_data[DATA_GROCY].update_product(id, product_group_id = data[CONF_PRODUCT_GROUP_ID],
                 location_id = data[CONF_PRODUCT_LOCATION_ID])
+            domain_data[DATA_SCHEDULER].async_notify_write()
             # Sync with grocy
             await domain_data[DATA_DATA].async_update_data([PRODUCTS_NAME], True)
             entity.async_schedule_update_ha_state(True)
@@ -179,7 +246,8 @@ async def async_add_product(hass, data):
             _LOGGER.debug(f"Add product")
             # Search store for product
             store = get_store(data[CONF_STORE])
-            store_product = store.get_product_by_barcode(data[CONF_BARCODE])
+            store_product = await domain_data[DATA_EXECUTOR].async_run_blocking(
+                store.get_product_by_barcode, data[CONF_BARCODE])
             if not store_product:
                 _LOGGER.debug(f"Product was not found: {data[CONF_BARCODE]}")
                 hass.bus.fire(DOMAIN_EVENT, {
@@ -189,30 +257,31 @@ async def async_add_product(hass, data):
                 return True
             _LOGGER.debug(f"Found product: {store_product.name}")
             # Add product to grocy (barcode is used as product id)
-            domain_data[DATA_GROCY].add_product(store_product.id, store_product.name,
+            await domain_data[DATA_GROCY].add_product(store_product.id, store_product.name,
                 store_product.barcode, data[CONF_PRODUCT_DESCRIPTION], data[CONF_PRODUCT_GROUP_ID],
                 store_product.qu_id_purchase, data[CONF_PRODUCT_LOCATION_ID], store_product.picture
             )
-            domain_data[DATA_GROCY].set_userfields('products', store_product.id, {
+            await domain_data[DATA_GROCY].set_userfields('products', store_product.id, {
                 'price': store_product.price,
                 'store': data[CONF_STORE].lower(),
                 'favorite': "0",
                 'popular': "0",
                 'metadata': store_product.metadata
             })
+            domain_data[DATA_SCHEDULER].async_notify_write()
             # Sync with grocy
             await domain_data[DATA_DATA].async_update_data([PRODUCTS_NAME], userfields=True)
             # Add product sensor
-            for product in domain_data[PRODUCTS_NAME]:
-                if product.id == store_product.id:
-                    entity_id = ProductSensor.to_entity_id(product.id)
-                    if not domain_data[DATA_ENTITIES].is_exists(entity_id):
-                        hass.add_job(ProductSensor(hass, product).async_add())
-                        _LOGGER.debug(f"Product {product.name} was added")
-                        hass.bus.fire(DOMAIN_EVENT, {
-                            "event": EVENT_PRODUCT_ADDED,
-                            "entity_id": entity_id
-                        })
+            product = domain_data[DATA_CATALOG].get_product(store_product.id)
+            if product:
+                entity_id = ProductSensor.to_entity_id(product.id)
+                if not domain_data[DATA_ENTITIES].is_exists(entity_id):
+                    GrocySensorEntity.async_add_batch(hass, [ProductSensor(hass, product)])
+                    _LOGGER.debug(f"Product {product.name} was added")
+                    hass.bus.fire(DOMAIN_EVENT, {
+                        "event": EVENT_PRODUCT_ADDED,
+                        "entity_id": entity_id
+                    })
     except Exception as e:
         _LOGGER.error(f"Failed to add product ({type(e).__name__})")
         _LOGGER.debug(e)
@@ -229,7 +298,7 @@ async def async_remove_product(hass, data):
             # Search for product by barcode (sensor state)
             barcode = hass.states.get(entity_id)
             if barcode:
-                product = domain_data[DATA_GROCY].get_product_by_barcode(barcode.state)
+                product = await domain_data[DATA_GROCY].get_product_by_barcode(barcode.state)
                 if product:
                     entity_id = 'sensor.product' + str(product.id)
                     entity = domain_data[DATA_ENTITIES].async_get(entity_id)
@@ -237,7 +306,8 @@ async def async_remove_product(hass, data):
             _LOGGER.debug(f"Remove product {entity.entity_id}")
             # Remove from grocy ERP
             product_id = entity.device_state_attributes['id']
-            domain_data[DATA_GROCY].remove_product(product_id)
+            await domain_data[DATA_GROCY].remove_product(product_id)
+            domain_data[DATA_SCHEDULER].async_notify_write()
             # Remove entity from home assisatnt
             hass.add_job(entity.async_remove)
             # Remove from local entity registry
@@ -258,10 +328,12 @@ async def async_add_favorite(hass, data):
     try:
         entity_id = data[CONF_ENTITY_ID][0]
         entity = domain_data[DATA_ENTITIES].async_get(entity_id)
-        domain_data[DATA_GROCY].set_userfield('products', entity.device_state_attributes['id'], 'favorite', "1")
-        # Force update to get userfieldss
-        await domain_data[DATA_DATA].async_update_data(force=True, userfields=True)
-        entity.async_schedule_update_ha_state(True)
+        # Queued first, replayed later if grocy is unreachable
+        if await domain_data[DATA_WRITE_QUEUE].async_set_userfield(
+                'products', entity.device_state_attributes['id'], 'favorite', "1"):
+            # Force update to get userfieldss
+            await domain_data[DATA_DATA].async_update_data(force=True, userfields=True)
+            entity.async_schedule_update_ha_state(True)
     except Exception as e:
         _LOGGER.error(f"Failed to add favorite ({type(e).__name__})")
         _LOGGER.debug(e)
@@ -272,10 +344,12 @@ async def async_remove_favorite(hass, data):
     try:
         entity_id = data[CONF_ENTITY_ID][0]
         entity = domain_data[DATA_ENTITIES].async_get(entity_id)
-        domain_data[DATA_GROCY].set_userfield('products', entity.device_state_attributes['id'], 'favorite', "0")
-        # Force update to get userfieldss
-        await domain_data[DATA_DATA].async_update_data(force=True, userfields=True)
-        entity.async_schedule_update_ha_state(True)
+        # Queued first, replayed later if grocy is unreachable
+        if await domain_data[DATA_WRITE_QUEUE].async_set_userfield(
+                'products', entity.device_state_attributes['id'], 'favorite', "0"):
+            # Force update to get userfieldss
+            await domain_data[DATA_DATA].async_update_data(force=True, userfields=True)
+            entity.async_schedule_update_ha_state(True)
     except Exception as e:
         _LOGGER.error(f"Failed to add favorite ({type(e).__name__})")
         _LOGGER.debug(e)
@@ -286,28 +360,16 @@ async def async_sync(hass, data):
     try:
         # Force update from grocy
         await domain_data[DATA_DATA].async_update_data(force=True, userfields=True)
-        # Add missing products
-        for product in domain_data[PRODUCTS_NAME]:
-            entity_id = ProductSensor.to_entity_id(product.id)
-            if not domain_data[DATA_ENTITIES].is_exists(entity_id):
-                hass.add_job(ProductSensor(hass, product).async_add())
-                _LOGGER.debug(f"Sync add product: {entity_id}")
-        # Remove floating products
-        for entity in domain_data[DATA_ENTITIES].async_get_all_by_class_name('ProductSensor'):
-            if not contains(domain_data[PRODUCTS_NAME], lambda p: p.id == entity.device_state_attributes['id']):
-                hass.add_job(entity.async_remove)
-                _LOGGER.debug(f"Remove product: {entity.entity_id}")
-        # Update products userfields
-        for product in domain_data[PRODUCTS_NAME]:
-            store = get_store(product.store)
-            store_product = Store(product.store).get_product_by_barcode(product.barcodes[0])
-            if store_product:
-                domain_data[DATA_GROCY].set_userfield('products', product.id, 'price', store_product.price)
-        # Force update to get userfieldss
-        await domain_data[DATA_DATA].async_update_data(force=True, userfields=True)
-        # Update all products
-        for entity in domain_data[DATA_ENTITIES].async_get_all():
-            entity.async_schedule_update_ha_state(True)
+        # Add missing products, remove floating ones
+        async_update_product_sensors(hass)
+        # Update products prices (only changed prices are written)
+        changed = await PriceRefresh(hass, domain_data[DATA_EXECUTOR], domain_data[DATA_WRITE_QUEUE]).async_run(
+            domain_data[DATA_CATALOG].get_products())
+        if StoreApiClient.cache is not None:
+            await domain_data[DATA_EXECUTOR].async_run_blocking(StoreApiClient.cache.save)
+        if changed:
+            # Force update to get userfieldss (changed entities are updated)
+            await domain_data[DATA_DATA].async_update_data([PRODUCTS_NAME], force=True, userfields=True)
         # Send event
         hass.bus.fire(DOMAIN_EVENT, {
             "event": EVENT_SYNC_DONE
@@ -324,17 +386,20 @@ async def async_fill_cart(hass, data):
         store_conf = domain_data[DATA_STORE_CONF]
         store = get_store(store_conf[CONF_NAME])
         # Convert grocy list to online store cart list
+        catalog = domain_data[DATA_CATALOG]
         items = []
-        for item in domain_data[SHOPPING_LIST_NAME]:
-            if item.shopping_list_id == 1:
-                for product in domain_data[PRODUCTS_NAME]:
-                    if product.id == item.product_id:
-                        items.append(store.to_cart_item(product, item.amount))
-        # Send cart to online store
-        if len(items):
-            store.login(store_conf[CONF_USERNAME], store_conf[CONF_PASSWORD])
-            store.fill_cart(items)
-            store.logout()
+        for item in catalog.get_shopping_list_items(1):
+            product = catalog.get_product(item.product_id)
+            if product:
+                items.append(store.to_cart_item(product, item.amount))
+        # Make the online store cart match the list (an empty list empties the cart)
+        executor = domain_data[DATA_EXECUTOR]
+        # The store client keeps its login between calls
+        await executor.async_run_blocking(store.ensure_login, store_conf[CONF_USERNAME], store_conf[CONF_PASSWORD])
+        # Only the lines that differ from the current cart are sent
+        delta = await executor.async_run_blocking(store.sync_cart, items)
+        _LOGGER.debug(f"Online store cart synced {delta}")
+        hass.bus.fire(DOMAIN_EVENT, dict(delta, event=EVENT_CART_SYNCED))
     except Exception as e:
         _LOGGER.error(f"Failed to fill online store cart ({type(e).__name__})")
         _LOGGER.debug(e)
@@ -345,23 +410,44 @@ async def async_empty_cart(hass, data):
     try:
         store_conf = domain_data[DATA_STORE_CONF]
         store = get_store(store_conf[CONF_NAME])
-        store.login(store_conf[CONF_USERNAME], store_conf[CONF_PASSWORD])
-        store.clear_cart()
-        store.logout()
+        executor = domain_data[DATA_EXECUTOR]
+        await executor.async_run_blocking(store.ensure_login, store_conf[CONF_USERNAME], store_conf[CONF_PASSWORD])
+        await executor.async_run_blocking(store.clear_cart)
     except Exception as e:
         _LOGGER.error(f"Failed to empty online store cart ({type(e).__name__})")
         _LOGGER.debug(e)
 
 
+async def async_compare_prices(hass, data):
+    domain_data = hass.data[DOMAIN_DATA]
+    try:
+        shopping_list_id = data[CONF_SHOPPING_LIST_ID]
+        catalog = domain_data[DATA_CATALOG]
+        items = [(catalog.get_product(item.product_id), item.amount)
+                 for item in catalog.get_shopping_list_items(shopping_list_id)
+                 if catalog.has_product(item.product_id)]
+        # All stores at once, each within its own timeout
+        comparison = await PriceComparison(domain_data[DATA_EXECUTOR]).async_compare(items)
+        domain_data[DATA_PRICE_COMPARISON][shopping_list_id] = comparison
+        domain_data[DATA_ENTITIES].async_schedule_update_ha_state(ShoppingListSensor.to_entity_id(shopping_list_id))
+        hass.bus.fire(DOMAIN_EVENT, {
+            "event": EVENT_PRICES_COMPARED,
+            "entity_id": ShoppingListSensor.to_entity_id(shopping_list_id)
+        })
+    except Exception as e:
+        _LOGGER.error(f"Failed to compare prices ({type(e).__name__})")
+        _LOGGER.debug(e)
+
+
 async def async_debug(hass, data):
     _LOGGER.debug('Debug service')
     domain_data = hass.data[DOMAIN_DATA]
     _LOGGER.debug('PRODUCTS')
     for product in domain_data[PRODUCTS_NAME]:
-        _LOGGER.debug(vars(product))
+        _LOGGER.debug(product.as_dict())
     _LOGGER.debug('SHOPPING LIST')
     for shopping_list in domain_data[SHOPPING_LIST_NAME]:
-        _LOGGER.debug(vars(shopping_list))
+        _LOGGER.debug(shopping_list.as_dict())
     _LOGGER.debug('ENTITIES')
     for entity in domain_data[DATA_ENTITIES].async_get_all():
         _LOGGER.debug(f"{entity.entity_id}")
\ No newline at end of file
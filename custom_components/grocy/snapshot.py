@@ -0,0 +1,75 @@
+'''Warm start snapshot of the grocy collections'''
+
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .grocy.grocy import ShoppingListProduct
+from .grocy.grocy_api_client import (ProductData, ShoppingList, LocationData,
+                                     QuantityUnitData, ProductGroupData)
+
+from .const import (DOMAIN,
+                    PRODUCTS_NAME, SHOPPING_LISTS_NAME, SHOPPING_LIST_NAME, LOCATIONS_NAME,
+                    QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME)
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_KEY = "{}.snapshot".format(DOMAIN)
+SNAPSHOT_SAVE_DELAY = 10
+
+# Collection -> model factory (from the grocy api format)
+SNAPSHOT_COLLECTIONS = {
+    PRODUCTS_NAME: ProductData,
+    SHOPPING_LIST_NAME: ShoppingListProduct.from_json,
+    SHOPPING_LISTS_NAME: ShoppingList,
+    LOCATIONS_NAME: LocationData,
+    QUANTITY_UNITS_NAME: QuantityUnitData,
+    PRODUCT_GROUPS_NAME: ProductGroupData
+}
+
+
+class SnapshotCache:
+    """Persist the last good collections to the HA config dir.
+
+    Each collection is stored column oriented ({"columns": [...], "rows": [[...], ...]})
+    so keys are not repeated for every object.
+    """
+
+    def __init__(self, hass):
+        """Initialize the class."""
+        self._store = Store(hass, SNAPSHOT_VERSION, SNAPSHOT_KEY)
+
+    async def async_load(self):
+        """Return the stored collections (None if there is no usable snapshot)."""
+        try:
+            stored = await self._store.async_load()
+            if not stored:
+                return None
+            return {name: self._decode(stored[name], factory)
+                    for name, factory in SNAPSHOT_COLLECTIONS.items()}
+        except Exception as e:
+            _LOGGER.warning(f"Ignoring grocy snapshot ({type(e).__name__})")
+            _LOGGER.debug(e)
+            return None
+
+    def async_schedule_save(self, domain_data):
+        """Save the collections in domain_data (delayed, bursts are written once)."""
+        self._store.async_delay_save(lambda: self._encode_all(domain_data), SNAPSHOT_SAVE_DELAY)
+
+    def _encode_all(self, domain_data):
+        return {name: self._encode(domain_data[name] or []) for name in SNAPSHOT_COLLECTIONS}
+
+    @staticmethod
+    def _encode(objects):
+        rows = [obj.to_json() for obj in objects]
+        columns = list(rows[0].keys()) if rows else []
+        return {
+            'columns': columns,
+            'rows': [[row[column] for column in columns] for row in rows]
+        }
+
+    @staticmethod
+    def _decode(encoded, factory):
+        columns = encoded['columns']
+        return [factory(dict(zip(columns, row))) for row in encoded['rows']]
@@ -1,18 +1,31 @@
 '''Store clients'''
 
+from .store_api_client import StoreApiClient
+from .store_cache import BarcodeCache
 from .store_none import NoneStoreApiClient
 from .store_rami_levy import RamiLevyStoreApiClient
 from .store_shufersal import ShufersalStoreApiClient
 from .store_my_supermarket import MySupermarketStoreApiClient
 
 
+# Store clients are long lived (keep-alive session, login token), one per store
+STORE_CLIENTS = [RamiLevyStoreApiClient, ShufersalStoreApiClient, MySupermarketStoreApiClient]
+_clients = {}
+
+
 def get_store(store_name: str):
-    ''' Create and return store client'''
-    if store_name.lower() == RamiLevyStoreApiClient.name.lower():
-        return RamiLevyStoreApiClient()
-    elif store_name.lower() == ShufersalStoreApiClient.name.lower():
-        return ShufersalStoreApiClient()
-    elif store_name.lower() == MySupermarketStoreApiClient.name.lower():
-        return MySupermarketStoreApiClient()
-    else:
-       return NoneStoreApiClient()
+    ''' Return the store client (created on first use)'''
+    key = store_name.lower()
+    client = _clients.get(key)
+    if client is None:
+        store_class = next((store_class for store_class in STORE_CLIENTS
+                            if store_class.name.lower() == key), NoneStoreApiClient)
+        client = _clients.setdefault(key, store_class())
+    return client
+
+
+def close_stores():
+    ''' Close the sessions of all store clients'''
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
@@ -1,12 +1,23 @@
 import logging
+import threading
+import time
 import requests
 
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
 
+from ..grocy.transport import TransportPolicy, DEFAULT_POLICY
+
 _LOGGER = logging.getLogger(__name__)
 
+DEFAULT_SEARCH_CONCURRENCY = 4
+DEFAULT_POOL_SIZE = 10
+# Login tokens are reused for this long (or until the store answers 401)
+DEFAULT_TOKEN_TTL = 60 * 60
+
 
 class ProductData(object):
     """Store product data"""
@@ -62,43 +73,194 @@ class ProductData(object):
         '''metaadata used by store api client'''
         return self._metadata
 
+    def to_json(self):
+        '''Return the data the product was created from'''
+        return {
+            'store': self._store,
+            'barcode': self._barcode,
+            'name': self._name,
+            'price': self._price,
+            'group_id': self._product_group_id,
+            'group_name': self._product_group_name,
+            'picture': self._picture,
+            'metadata': self._metadata
+        }
+
 
 class StoreApiClient(ABC):
     """Online store api client interface"""
-        
-    def __init__(self, name: str, base_url: str, username: str, password: str):
+    # Barcode lookups cache shared by all store clients (None to disable)
+    cache = None
+
+    @staticmethod
+    def set_cache(cache):
+        '''Set the barcode lookups cache shared by all store clients'''
+        StoreApiClient.cache = cache
+
+    def __init__(self, name: str, base_url: str, username: str, password: str,
+                 policy: TransportPolicy = None):
         '''Initialize online store client'''
         self._name = name
+        self._policy = policy or DEFAULT_POLICY
         self._base_url = f"https://{base_url}"
         self._session = None
+        self._search_executor = None
         self._username = username
         self._password = password
+        self._token = None
+        self._token_expires = 0
+        self._credentials = None
+        self._login_lock = threading.Lock()
+        self._session_lock = threading.Lock()
 
     @property
     def name(self) -> str:
         '''Return online store name'''
         return self._name
 
-    def _do_get_request(self, end_url, timeout: int = 20, verify_ssl: bool = True, headers = { "accept": "application/json" }):
+    @property
+    def is_logged_in(self) -> bool:
+        '''Return True while the login token is valid'''
+        return self._token is not None and time.monotonic() < self._token_expires
+
+    def _get_session(self) -> requests.Session:
+        '''Return the keep-alive session (shared by the requests of this client)'''
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def _get_search_executor(self) -> ThreadPoolExecutor:
+        '''Return the thread pool of the paginated searches (shared by the searches of this client)'''
+        with self._session_lock:
+            if self._search_executor is None:
+                self._search_executor = ThreadPoolExecutor(max_workers=DEFAULT_SEARCH_CONCURRENCY)
+            return self._search_executor
+
+    def close(self):
+        '''Close the session and the search threads'''
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._search_executor is not None:
+                self._search_executor.shutdown(wait=False)
+                self._search_executor = None
+        self._token = None
+
+    def _set_token(self, token, username: str, password: str, ttl: float = DEFAULT_TOKEN_TTL):
+        '''Keep a login token (called by login)'''
+        self._token = token
+        self._token_expires = time.monotonic() + ttl
+        self._credentials = (username, password)
+
+    def ensure_login(self, username: str = None, password: str = None):
+        '''Login unless already logged in with these credentials'''
+        username = username or self._username
+        password = password or self._password
+        with self._login_lock:
+            if self.is_logged_in and self._credentials == (username, password):
+                return
+            self.login(username, password)
+
+    def _do_authorized(self, request):
+        '''Call request() (a logged in request), login again and retry once if the token was rejected'''
+        try:
+            return request()
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 401 or self._credentials is None:
+                raise
+            _LOGGER.debug(f"{self._name} token rejected, login again")
+            with self._login_lock:
+                self._token = None
+                self.login(*self._credentials)
+            return request()
+
+    def _do_get_request(self, end_url, timeout = None, verify_ssl: bool = True, headers = { "accept": "application/json" }):
         req_url = urljoin(self._base_url, end_url)
-        resp = requests.get(req_url, verify=verify_ssl, headers=headers, timeout=timeout)
-        _LOGGER.debug(f"GET {req_url} {resp.status_code}")
-        resp.raise_for_status()
-        if len(resp.content) > 0:
-            return resp.json()
+
+        def request():
+            resp = self._get_session().get(req_url, verify=verify_ssl, headers=headers,
+                                           timeout=timeout or self._policy.timeout)
+            _LOGGER.debug(f"GET {req_url} {resp.status_code}")
+            resp.raise_for_status()
+            if len(resp.content) > 0:
+                return resp.json()
+
+        return self._policy.run('GET', req_url, request)
 
     def _do_post_request(self, end_url, data, verify_ssl: bool = True, headers = { "accept": "application/json" }):
         req_url = urljoin(self._base_url, end_url)
-        resp = requests.post(req_url, verify=verify_ssl, headers=headers, data=data)
-        _LOGGER.debug(f"POST {req_url} {resp.status_code}")
-        resp.raise_for_status()
-        if len(resp.content) > 0:
-            return resp.json()
-
-    def get_product_by_barcode(self, barcode: str):
-        '''Return store product by barcode'''
+
+        def request():
+            resp = self._get_session().post(req_url, verify=verify_ssl, headers=headers, data=data,
+                                            timeout=self._policy.timeout)
+            _LOGGER.debug(f"POST {req_url} {resp.status_code}")
+            resp.raise_for_status()
+            if len(resp.content) > 0:
+                return resp.json()
+
+        return self._policy.run('POST', req_url, request)
+
+    def get_cached_product_by_barcode(self, barcode: str):
+        '''Return (True, product) if the barcode lookup is cached (product is None if not found)'''
+        cache = StoreApiClient.cache
+        if cache is not None:
+            hit, data = cache.get(self._name, barcode)
+            if hit:
+                return True, ProductData(data) if data is not None else None
+        return False, None
+
+    def get_product_by_barcode(self, barcode: str, refresh: bool = False):
+        '''Return store product by barcode (from the cache unless refresh)'''
+        if not refresh:
+            hit, product = self.get_cached_product_by_barcode(barcode)
+            if hit:
+                return product
+        cache = StoreApiClient.cache
+        product = self._search_product_by_barcode(barcode)
+        if cache is not None:
+            cache.put(self._name, barcode, product.to_json() if product else None)
+        return product
+
+    def _search_product_by_barcode(self, barcode: str):
+        '''Search the online store for a product by barcode'''
         pass
 
+    def _paginated_search(self, fetch_page, match):
+        '''Return the first match of a paginated search (None if there is none)
+
+        fetch_page(offset) returns (items, total), match(item) returns the result or None.
+        The first page gives the page size and total, the rest is fetched concurrently
+        (at most DEFAULT_SEARCH_CONCURRENCY pages per client) and pages not started yet
+        are cancelled once a match is found.
+        '''
+        items, total = fetch_page(0)
+        for item in items:
+            result = match(item)
+            if result is not None:
+                return result
+        page_size = len(items)
+        if not page_size or not total or total <= page_size:
+            return None
+        executor = self._get_search_executor()
+        futures = [executor.submit(fetch_page, offset) for offset in range(page_size, total, page_size)]
+        try:
+            for future in as_completed(futures):
+                items, _ = future.result()
+                for item in items:
+                    result = match(item)
+                    if result is not None:
+                        return result
+            return None
+        finally:
+            for future in futures:
+                future.cancel()
+
     def login(self, username: str, password: str):
         '''Login to online store'''
         raise Exception('online store cart not supported')
@@ -123,6 +285,47 @@ class StoreApiClient(ABC):
         ''''''
         raise Exception('online store cart not supported')
 
+    def sync_cart(self, items):
+        '''Make the online store cart hold exactly items, return the delta
+
+        The cart is fetched once and only added, changed and removed lines are
+        sent (removed lines with quantity 0), in one fill_cart request.
+        '''
+        current = {self._cart_item_key(item): item for item in self.get_cart()}
+        wanted = {}
+        for item in items:
+            key = self._cart_item_key(item)
+            if key in wanted:
+                # Same store item for several products
+                item = self._cart_item_with_quantity(
+                    item, self._cart_item_quantity(wanted[key]) + self._cart_item_quantity(item))
+            wanted[key] = item
+        added = [item for key, item in wanted.items() if key not in current]
+        changed = [item for key, item in wanted.items() if key in current and
+                   self._cart_item_quantity(item) != self._cart_item_quantity(current[key])]
+        removed = [self._cart_item_with_quantity(item, 0) for key, item in current.items() if key not in wanted]
+        lines = added + changed + removed
+        if lines:
+            self.fill_cart(lines)
+        return {
+            'added': len(added),
+            'changed': len(changed),
+            'removed': len(removed),
+            'unchanged': len(wanted) - len(added) - len(changed)
+        }
+
+    def _cart_item_key(self, item):
+        '''Return the store item id of a cart item'''
+        raise Exception('online store cart not supported')
+
+    def _cart_item_quantity(self, item) -> float:
+        '''Return the quantity of a cart item'''
+        raise Exception('online store cart not supported')
+
+    def _cart_item_with_quantity(self, item, quantity):
+        '''Return a copy of a cart item with another quantity'''
+        raise Exception('online store cart not supported')
+
     def to_cart_item(self, product, quantity):
         '''Convert grocy product to store cart item representation'''
         raise Exception('online store cart not supported')
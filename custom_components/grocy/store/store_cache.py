@@ -0,0 +1,163 @@
+'''Barcode lookup cache shared by the store clients'''
+
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 5000
+DEFAULT_NEGATIVE_CACHE_SIZE = 1000
+# Prices change, found products are looked up again after a day
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+# Stores add products, missing barcodes are looked up again after an hour
+DEFAULT_NEGATIVE_CACHE_TTL = 60 * 60
+# Unsaved lookups written to disk at most every N puts (and on save())
+DEFAULT_SAVE_EVERY = 50
+
+CACHE_VERSION = 1
+
+
+class BarcodeCache:
+    """(store, barcode) -> product data, LRU capped, expiring and persisted as JSON.
+
+    Found products and missing barcodes are kept in separate LRUs, so a burst of
+    unknown barcodes can't evict the products we know. Thread safe, store clients
+    run in the executor.
+    """
+
+    def __init__(self, path: str = None, max_size: int = DEFAULT_CACHE_SIZE,
+                 ttl: float = DEFAULT_CACHE_TTL,
+                 negative_max_size: int = DEFAULT_NEGATIVE_CACHE_SIZE,
+                 negative_ttl: float = DEFAULT_NEGATIVE_CACHE_TTL,
+                 save_every: int = DEFAULT_SAVE_EVERY):
+        '''Initialize the cache, path is the JSON file (None for memory only)'''
+        self._path = path
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_max_size = negative_max_size
+        self._negative_ttl = negative_ttl
+        self._save_every = save_every
+        # (store, barcode) -> (timestamp, data), least recently used first
+        self._entries = OrderedDict()
+        # (store, barcode) -> timestamp
+        self._negative = OrderedDict()
+        self._unsaved = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def get(self, store: str, barcode: str):
+        '''Return (True, data) on a hit (data is None for a known missing barcode), (False, None) on a miss'''
+        key = (store, barcode)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self._ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+            timestamp = self._negative.get(key)
+            if timestamp is not None:
+                if now - timestamp < self._negative_ttl:
+                    self._negative.move_to_end(key)
+                    self._hits += 1
+                    return True, None
+                del self._negative[key]
+            self._misses += 1
+            return False, None
+
+    def put(self, store: str, barcode: str, data):
+        '''Cache a lookup result, data is None when the store doesn't have the barcode'''
+        key = (store, barcode)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._negative.pop(key, None)
+            if data is not None:
+                self._entries[key] = (now, data)
+                self._evict(self._entries, self._max_size)
+            else:
+                self._negative[key] = now
+                self._evict(self._negative, self._negative_max_size)
+            self._unsaved += 1
+            save = self._unsaved >= self._save_every
+        if save:
+            self.save()
+
+    def invalidate(self, store: str, barcode: str):
+        '''Forget a barcode'''
+        with self._lock:
+            self._entries.pop((store, barcode), None)
+            self._negative.pop((store, barcode), None)
+
+    @staticmethod
+    def _evict(entries, max_size: int):
+        while len(entries) > max_size:
+            entries.popitem(last=False)
+
+    def load(self):
+        '''Load the cache file (blocking), expired entries are skipped'''
+        if not self._path or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, encoding='utf-8') as cache_file:
+                stored = json.load(cache_file)
+            if stored.get('version') != CACHE_VERSION:
+                return
+            now = time.time()
+            with self._lock:
+                for store, barcode, timestamp, data in stored.get('entries', []):
+                    if now - timestamp < self._ttl:
+                        self._entries[(store, barcode)] = (timestamp, data)
+                for store, barcode, timestamp in stored.get('negative', []):
+                    if now - timestamp < self._negative_ttl:
+                        self._negative[(store, barcode)] = timestamp
+                self._evict(self._entries, self._max_size)
+                self._evict(self._negative, self._negative_max_size)
+            _LOGGER.debug(f"Loaded {len(self._entries)} cached barcodes")
+        except Exception as e:
+            _LOGGER.warning(f"Ignoring barcode cache ({type(e).__name__})")
+            _LOGGER.debug(e)
+
+    def save(self):
+        '''Write the cache file if it changed (blocking)'''
+        with self._lock:
+            if not self._path or not self._unsaved:
+                return
+            stored = {
+                'version': CACHE_VERSION,
+                'entries': [[store, barcode, timestamp, data]
+                            for (store, barcode), (timestamp, data) in self._entries.items()],
+                'negative': [[store, barcode, timestamp]
+                             for (store, barcode), timestamp in self._negative.items()]
+            }
+            self._unsaved = 0
+        try:
+            # Written aside and renamed, a crash never leaves a truncated file
+            with self._save_lock:
+                temp_path = f"{self._path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as cache_file:
+                    json.dump(stored, cache_file)
+                os.replace(temp_path, self._path)
+        except Exception as e:
+            _LOGGER.warning(f"Failed to save barcode cache ({type(e).__name__})")
+            _LOGGER.debug(e)
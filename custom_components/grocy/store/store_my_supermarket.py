@@ -18,7 +18,7 @@ class MySupermarketStoreApiClient(StoreApiClient):
     def __init__(self, username: str = None, password: str = None):
         super().__init__(MySupermarketStoreApiClient.name, 'chp.co.il/', username, password)
 
-    def get_product_by_barcode(self, barcode: str) -> ProductData:
+    def _search_product_by_barcode(self, barcode: str) -> ProductData:
         parsed_json = self._do_get_request(f"autocompletion/product_extended?term={barcode}")
         if parsed_json:
             for item in parsed_json:
@@ -33,4 +33,4 @@ class MySupermarketStoreApiClient(StoreApiClient):
                     "metadata": ""
                 }
                 if data['barcode'] == barcode:
-                    return ProductData(item)
+                    return ProductData(data)
@@ -9,5 +9,5 @@ class NoneStoreApiClient(StoreApiClient):
     def __init__(self, username: str = None, password: str = None):
         super().__init__(NoneStoreApiClient.name, "", username, password)
 
-    def get_product_by_barcode(self, barcode: str) -> ProductData:
+    def _search_product_by_barcode(self, barcode: str) -> ProductData:
         return None
\ No newline at end of file
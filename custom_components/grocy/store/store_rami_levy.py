@@ -2,7 +2,6 @@
 
 import json
 import logging
-import requests
 
 from urllib.parse import urljoin
 from requests.auth import HTTPBasicAuth
@@ -21,66 +20,62 @@ class RamiLevyStoreApiClient(StoreApiClient):
     def __init__(self, username: str = None, password: str = None):
         super().__init__(RamiLevyStoreApiClient.name, 'www.rami-levy.co.il', username, password)
         self._store_id = 331
-        self._token = None
 
-    def get_product_by_barcode(self, barcode: str) -> ProductData:
-        index = 0
-        total = 1
-        while index < total:
+    def _search_product_by_barcode(self, barcode: str) -> ProductData:
+        def fetch_page(index):
             parsed_json = self._do_get_request(f"api/search?store={self._store_id}&q={barcode}&from={index}")
-            if parsed_json:
-                # Search for barcode in page
-                for item in parsed_json['data']:
-                    data = {
-                        "store": self._name,
-                        "barcode": str(item['barcode']),
-                        "name": item['name'],
-                        "group_id": item['group_id'],
-                        "price": parse_float(item['price']['price']),
-                        "group_name": "Others",
-                        "picture": "https://static.rami-levy.co.il/storage/images/{}/{}/small.jpg".format(
-                                        item['barcode'], item['id']),
-                        "metadata": json.dumps({'id': item['id']})
-                    }
-                    if data['barcode'] == barcode:
-                        _LOGGER.debug(item)
-                        return ProductData(data)
-                # Next page
-                index += len(parsed_json['data'])
-                total = parse_int(parsed_json.get('total'))
-            else:
-                break
+            if not parsed_json:
+                return [], 0
+            return parsed_json['data'], parse_int(parsed_json.get('total'))
+
+        def match(item):
+            # Search for barcode in page
+            if str(item['barcode']) != barcode:
+                return None
+            _LOGGER.debug(item)
+            return ProductData({
+                "store": self._name,
+                "barcode": str(item['barcode']),
+                "name": item['name'],
+                "group_id": item['group_id'],
+                "price": parse_float(item['price']['price']),
+                "group_name": "Others",
+                "picture": "https://static.rami-levy.co.il/storage/images/{}/{}/small.jpg".format(
+                                item['barcode'], item['id']),
+                "metadata": json.dumps({'id': item['id']})
+            })
+
+        return self._paginated_search(fetch_page, match)
 
     def login(self, username: str = None, password: str = None):
         '''Login to online store'''
-        self._session = requests.Session()
+        username = username or self._username
+        password = password or self._password
         data = {
-            "username": username or self._username,
-            "password": password or self._password
+            "username": username,
+            "password": password
         }
         headers = {
             'Accept': 'application/json, text/plain, */*',
             'Content-Type': 'application/json;charset=UTF-8'
         }
         req_url = urljoin('https://api-prod.rami-levy.co.il', 'api/v1/auth/login')
-        response = self._session.post(req_url, headers=headers, data=json.dumps(data))
-        _LOGGER.debug(f"POST {req_url} {headers} {response.status_code}")
-        response.raise_for_status()
-        _LOGGER.debug(f"RESPONSE: {response.json()['user']}")
-        self._token = response.json()['user']['token']
+
+        def request():
+            response = self._get_session().post(req_url, headers=headers, data=json.dumps(data),
+                                                timeout=self._policy.timeout)
+            _LOGGER.debug(f"POST {req_url} {response.status_code}")
+            response.raise_for_status()
+            return response.json()
+
+        self._set_token(self._policy.run('POST', req_url, request)['user']['token'], username, password)
 
     def logout(self):
-        '''Logout from online store'''
-        self._session = None
+        '''Logout from online store (the session is kept)'''
         self._token = None
 
-    def fill_cart(self, items):
-        '''Fill online store with cart items'''
-        data = json.dumps({
-            "store": self._store_id,
-            "items": items
-        })
-        headers = {
+    def _cart_headers(self):
+        return {
             'Origin': 'https://www.rami-levy.co.il',
             'Accept': 'application/json, text/plain, */*',
             'Accept-Language': 'en-US,en;q=0.9,he-IL;q=0.8,he;q=0.7',
@@ -89,26 +84,31 @@ class RamiLevyStoreApiClient(StoreApiClient):
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:71.0) Gecko/20100101 Firefox/71.0',
             'ecomtoken': self._token
         }
-        req_url = urljoin('https://api-prod.rami-levy.co.il', 'api/v1/cart/add-line-to-cart')
-        response = self._session.post(req_url, headers=headers, data=data)
-        _LOGGER.debug(f"POST {req_url} {headers} {data} {response.status_code}")
-        response.raise_for_status()
+
+    def _do_cart_request(self, end_url, data = None):
+        '''POST to the cart api with the login token (login again if it expired)'''
+        req_url = urljoin('https://api-prod.rami-levy.co.il', end_url)
+
+        def request():
+            response = self._get_session().post(req_url, headers=self._cart_headers(), data=data,
+                                                timeout=self._policy.timeout)
+            _LOGGER.debug(f"POST {req_url} {data} {response.status_code}")
+            response.raise_for_status()
+            return response
+
+        return self._do_authorized(lambda: self._policy.run('POST', req_url, request))
+
+    def fill_cart(self, items):
+        '''Fill online store with cart items'''
+        data = json.dumps({
+            "store": self._store_id,
+            "items": items
+        })
+        self._do_cart_request('api/v1/cart/add-line-to-cart', data)
 
     def get_cart(self):
         '''Get items from online store cart'''
-        headers = {
-            'Origin': 'https://www.rami-levy.co.il',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.9,he-IL;q=0.8,he;q=0.7',
-            'Locale': 'he',
-            'Content-Type': 'application/json;charset=UTF-8',
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:71.0) Gecko/20100101 Firefox/71.0',
-            'ecomtoken': self._token
-        }
-        req_url = urljoin('https://api-prod.rami-levy.co.il', 'api/v1/cart/get-cart')
-        response = self._session.post(req_url, headers=headers)
-        _LOGGER.debug(f"POST {req_url} {headers} {response.status_code}")
-        response.raise_for_status()
+        response = self._do_cart_request('api/v1/cart/get-cart')
         _LOGGER.debug(f"RESPONSE {response.text}")
         # Convert get_cart format to fill_cart format
         cart = json.loads(response.text)["items"]
@@ -126,19 +126,16 @@ class RamiLevyStoreApiClient(StoreApiClient):
 
     def empty_cart(self):
         '''Empty online store cart'''
-        headers = {
-            'Origin': 'https://www.rami-levy.co.il',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.9,he-IL;q=0.8,he;q=0.7',
-            'Locale': 'he',
-            'Content-Type': 'application/json;charset=UTF-8',
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:71.0) Gecko/20100101 Firefox/71.0',
-            'ecomtoken': self._token
-        }
-        req_url = urljoin('https://api-prod.rami-levy.co.il', 'api/v1/cart/delete-cart')
-        response = self._session.post(req_url, headers=headers)
-        _LOGGER.debug(f"POST {req_url} {headers} {response.status_code}")
-        response.raise_for_status()
+        self._do_cart_request('api/v1/cart/delete-cart')
+
+    def _cart_item_key(self, item):
+        return str(item['C'])
+
+    def _cart_item_quantity(self, item) -> float:
+        return parse_float(item['Quantity'], 0)
+
+    def _cart_item_with_quantity(self, item, quantity):
+        return dict(item, Quantity=str(quantity))
 
     def to_cart_item(self, product, quantity):
         '''Convert grocy product to online store cart item format'''
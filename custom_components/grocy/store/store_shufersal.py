@@ -18,7 +18,7 @@ class ShufersalStoreApiClient(StoreApiClient):
     def __init__(self, username: str = None, password: str = None):
         super().__init__(ShufersalStoreApiClient.name, 'www.shufersal.co.il', username, password)
 
-    def get_product_by_barcode(self, barcode: str) -> ProductData:
+    def _search_product_by_barcode(self, barcode: str) -> ProductData:
         limit = 10
         parsed_json = self._do_get_request(f"online/he/search/results?q={barcode}%3Arelevance&limit={limit}")
         if parsed_json:
@@ -35,4 +35,4 @@ class ShufersalStoreApiClient(StoreApiClient):
                 }
                 if data['barcode'] == barcode:
                     _LOGGER.debug(item)
-                    return ProductData(item)
\ No newline at end of file
+                    return ProductData(data)
\ No newline at end of file
@@ -0,0 +1,212 @@
+'''Durable write-ahead queue for grocy mutations'''
+
+import asyncio
+import logging
+
+import aiohttp
+
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+
+from .const import (DOMAIN,
+                    DEFAULT_REPLAY_BATCH_SIZE, DEFAULT_MIN_RETRY_INTERVAL, DEFAULT_MAX_RETRY_INTERVAL)
+
+_LOGGER = logging.getLogger(__name__)
+
+WRITE_QUEUE_VERSION = 1
+WRITE_QUEUE_KEY = "{}.write_queue".format(DOMAIN)
+
+OP_SHOPPING_LIST = 'shopping_list'
+OP_USERFIELD = 'userfield'
+
+
+def shopping_list_op(product_id: int, shopping_list_id: int, amount) -> dict:
+    """Return an operation adding (amount > 0) or subtracting (amount < 0) a shopping list item."""
+    return {'op': OP_SHOPPING_LIST, 'product_id': product_id,
+            'shopping_list_id': shopping_list_id, 'amount': amount}
+
+
+def userfield_op(entity: str, object_id: int, key: str, value) -> dict:
+    """Return an operation setting one userfield."""
+    return {'op': OP_USERFIELD, 'entity': entity, 'object_id': object_id, 'key': key, 'value': value}
+
+
+def _op_key(op):
+    if op['op'] == OP_SHOPPING_LIST:
+        return (OP_SHOPPING_LIST, op['product_id'], op['shopping_list_id'])
+    return (OP_USERFIELD, op['entity'], op['object_id'], op['key'])
+
+
+def _can_merge(older, newer) -> bool:
+    """Return True if two operations of the same key (older first) can be sent as one."""
+    if older['op'] == OP_SHOPPING_LIST:
+        # Grocy stops subtracting at 0, a subtract followed by an add is not a net delta
+        return older['amount'] > 0 or (older['amount'] < 0) == (newer['amount'] < 0)
+    return True
+
+
+def _merge(older, newer):
+    """Merge two mergeable operations of the same key (older first), return None if they cancel out."""
+    if older['op'] == OP_SHOPPING_LIST:
+        amount = older['amount'] + newer['amount']
+        return dict(older, amount=amount) if amount else None
+    # Last write wins
+    return newer
+
+
+class WriteQueue:
+    """Shopping list and userfield mutations, stored before they are sent to grocy.
+
+    Adds and subtracts of the same product and list are coalesced into one net delta
+    (a subtract followed by an add is kept apart, grocy doesn't go below 0), userfield
+    writes of the same field keep the last value. Operations are replayed in order, in
+    concurrent batches, and retried with backoff while grocy is unreachable.
+    """
+
+    def __init__(self, hass, client, on_write = None,
+                 batch_size: int = DEFAULT_REPLAY_BATCH_SIZE,
+                 min_retry_interval: float = DEFAULT_MIN_RETRY_INTERVAL,
+                 max_retry_interval: float = DEFAULT_MAX_RETRY_INTERVAL):
+        """Initialize the class."""
+        self._hass = hass
+        self._client = client
+        self._on_write = on_write
+        self._batch_size = batch_size
+        self._min_retry_interval = min_retry_interval
+        self._max_retry_interval = max_retry_interval
+        self._retry_interval = min_retry_interval
+        self._store = Store(hass, WRITE_QUEUE_VERSION, WRITE_QUEUE_KEY)
+        self._ops = []
+        self._lock = asyncio.Lock()
+        self._unsub_retry = None
+
+    def __len__(self):
+        return len(self._ops)
+
+    async def async_load(self):
+        """Load operations left over from the last run."""
+        stored = await self._store.async_load()
+        self._ops = stored.get('ops', []) if stored else []
+        if self._ops:
+            _LOGGER.debug(f"Loaded {len(self._ops)} queued grocy writes")
+
+    async def _async_save(self):
+        await self._store.async_save({'ops': self._ops})
+
+    def _enqueue(self, op):
+        """Add an operation, coalesced with the last queued one of the same key when possible."""
+        key = _op_key(op)
+        for index in range(len(self._ops) - 1, -1, -1):
+            queued = self._ops[index]
+            if _op_key(queued) == key:
+                if not _can_merge(queued, op):
+                    break
+                merged = _merge(queued, op)
+                if merged is None:
+                    del self._ops[index]
+                else:
+                    self._ops[index] = merged
+                return
+        self._ops.append(op)
+
+    def _requeue(self, failed):
+        """Put failed operations back in front of the queue (before newer ones)."""
+        for op in reversed(failed):
+            key = _op_key(op)
+            for index, queued in enumerate(self._ops):
+                if _op_key(queued) == key:
+                    if _can_merge(op, queued):
+                        del self._ops[index]
+                        op = _merge(op, queued)
+                    break
+            if op is not None:
+                self._ops.insert(0, op)
+
+    async def async_add_to_shopping_list(self, product_id: int, shopping_list_id: int, amount) -> bool:
+        """Queue an add, return True if it (and everything before it) reached grocy."""
+        return await self.async_submit([shopping_list_op(product_id, shopping_list_id, amount)])
+
+    async def async_subtract_from_shopping_list(self, product_id: int, shopping_list_id: int, amount) -> bool:
+        """Queue a subtract, return True if it (and everything before it) reached grocy."""
+        return await self.async_submit([shopping_list_op(product_id, shopping_list_id, -amount)])
+
+    async def async_set_userfield(self, entity: str, object_id: int, key: str, value) -> bool:
+        """Queue a userfield write, return True if it (and everything before it) reached grocy."""
+        return await self.async_submit([userfield_op(entity, object_id, key, value)])
+
+    async def async_submit(self, ops) -> bool:
+        """Store operations, then try to send everything queued."""
+        for op in ops:
+            self._enqueue(op)
+        await self._async_save()
+        return await self.async_flush()
+
+    async def _async_send(self, op):
+        if op['op'] == OP_SHOPPING_LIST:
+            if op['amount'] > 0:
+                await self._client.add_product_to_shopping_list(
+                    op['product_id'], op['shopping_list_id'], op['amount'])
+            else:
+                await self._client.remove_product_in_shopping_list(
+                    op['product_id'], op['shopping_list_id'], -op['amount'])
+        else:
+            await self._client.set_userfield(op['entity'], op['object_id'], op['key'], op['value'])
+
+    @staticmethod
+    def _is_retryable(error) -> bool:
+        # Grocy rejected the request itself (e.g. product was removed), retrying won't help
+        return not (isinstance(error, aiohttp.ClientResponseError) and error.status < 500)
+
+    def _next_batch(self):
+        """Return the queued operations sent together, up to the first repeated key.
+
+        Operations of the same key that couldn't be merged must reach grocy in order."""
+        batch = []
+        keys = set()
+        for op in self._ops[:self._batch_size]:
+            key = _op_key(op)
+            if key in keys:
+                break
+            keys.add(key)
+            batch.append(op)
+        return batch
+
+    async def async_flush(self) -> bool:
+        """Replay queued operations in order, return True if the queue is empty."""
+        async with self._lock:
+            sent = 0
+            try:
+                while self._ops:
+                    batch = self._next_batch()
+                    del self._ops[:len(batch)]
+                    results = await asyncio.gather(*[self._async_send(op) for op in batch],
+                                                   return_exceptions=True)
+                    failed = []
+                    for op, result in zip(batch, results):
+                        if not isinstance(result, Exception):
+                            sent += 1
+                        elif self._is_retryable(result):
+                            failed.append(op)
+                        else:
+                            _LOGGER.error(f"Dropping grocy write {op} ({type(result).__name__})")
+                    if failed:
+                        self._requeue(failed)
+                        _LOGGER.warning(f"Grocy unreachable, {len(self._ops)} writes queued")
+                        self._schedule_retry()
+                        return False
+                self._retry_interval = self._min_retry_interval
+                return True
+            finally:
+                await self._async_save()
+                if sent and self._on_write:
+                    self._on_write()
+
+    def _schedule_retry(self):
+        if self._unsub_retry:
+            self._unsub_retry()
+        self._unsub_retry = async_call_later(self._hass, self._retry_interval, self._async_retry)
+        self._retry_interval = min(self._retry_interval * 2, self._max_retry_interval)
+
+    async def _async_retry(self, now = None):
+        self._unsub_retry = None
+        await self.async_flush()
@@ -0,0 +1,51 @@
+'''Test setup, the component modules are imported without running the integration setup
+
+The package __init__ (async_setup) needs home assistant, the modules under test only use a
+few of its helpers. When home assistant isn't installed those helpers are replaced by
+minimal stand-ins.
+'''
+
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+COMPONENT_DIR = os.path.join(ROOT, 'custom_components', 'grocy')
+
+sys.path.insert(0, ROOT)
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+class _Store:
+    '''In memory homeassistant.helpers.storage.Store'''
+
+    def __init__(self, hass, version, key):
+        self._data = None
+
+    async def async_load(self):
+        return self._data
+
+    async def async_save(self, data):
+        self._data = data
+
+
+def _async_call_later(hass, delay, action):
+    return lambda: None
+
+
+if importlib.util.find_spec('homeassistant') is None:
+    _module('homeassistant', __path__=[])
+    _module('homeassistant.core', callback=lambda func: func)
+    _module('homeassistant.helpers', __path__=[])
+    _module('homeassistant.helpers.event', async_call_later=_async_call_later)
+    _module('homeassistant.helpers.storage', Store=_Store)
+
+_module('custom_components', __path__=[os.path.join(ROOT, 'custom_components')])
+_module('custom_components.grocy', __path__=[COMPONENT_DIR])
@@ -0,0 +1,80 @@
+'''Catalog shopping list totals'''
+
+from custom_components.grocy.catalog import Catalog
+from custom_components.grocy.grocy.grocy import ShoppingListProduct
+from custom_components.grocy.grocy.grocy_api_client import ProductData, ProductGroupData
+from custom_components.grocy.const import (PRODUCTS_NAME, SHOPPING_LISTS_NAME, SHOPPING_LIST_NAME,
+                                           LOCATIONS_NAME, QUANTITY_UNITS_NAME, PRODUCT_GROUPS_NAME)
+
+
+def product(id, price, product_group_id = 1, store = 'rami levy'):
+    return ProductData({'id': str(id), 'name': f"Product {id}", 'product_group_id': str(product_group_id),
+                        'barcode': f"729{id:010d}", 'userfields': {'price': str(price), 'store': store}})
+
+
+def item(id, product_id, amount, shopping_list_id = 1):
+    return ShoppingListProduct.from_json({'id': id, 'product_id': product_id, 'amount': amount,
+                                          'shopping_list_id': shopping_list_id, 'done': 0})
+
+
+def make_data(products, items):
+    return {
+        PRODUCTS_NAME: products,
+        SHOPPING_LIST_NAME: items,
+        SHOPPING_LISTS_NAME: [],
+        LOCATIONS_NAME: [],
+        QUANTITY_UNITS_NAME: [],
+        PRODUCT_GROUPS_NAME: [ProductGroupData({'id': '1', 'name': 'Dairy'}),
+                              ProductGroupData({'id': '2', 'name': 'Bakery'})]
+    }
+
+
+def test_rebuild_totals():
+    catalog = Catalog()
+    data = make_data([product(1, 5, 1), product(2, 2.5, 2, 'shufersal')],
+                     [item(1, 1, 2), item(2, 2, 4), item(3, 1, 1, shopping_list_id=2)])
+    catalog.rebuild(data)
+    totals = catalog.get_shopping_list_totals(1)
+    assert totals.count == 2
+    assert totals.total_amount == 6
+    assert totals.total_price == 20
+    attributes = totals.as_attributes()
+    assert attributes['product_groups'] == {'Dairy': {'count': 1, 'amount': 2, 'price': 10},
+                                            'Bakery': {'count': 1, 'amount': 4, 'price': 10}}
+    assert set(attributes['stores']) == {'rami levy', 'shufersal'}
+    assert catalog.get_shopping_list_totals(2).total_price == 5
+
+
+def test_rebuild_updates_only_changed_lists():
+    catalog = Catalog()
+    products = [product(1, 5), product(2, 2.5, 2)]
+    catalog.rebuild(make_data(products, [item(1, 1, 2), item(2, 2, 4), item(3, 1, 1, shopping_list_id=2)]))
+    # Item 2 removed, item 1 amount changed, list 2 untouched
+    changes = catalog.rebuild(make_data(products, [item(1, 1, 3), item(3, 1, 1, shopping_list_id=2)]))
+    assert changes.shopping_lists == {1}
+    totals = catalog.get_shopping_list_totals(1)
+    assert (totals.count, totals.total_amount, totals.total_price) == (1, 3, 15)
+    assert set(totals.as_attributes()['product_groups']) == {'Dairy'}
+
+
+def test_price_change_updates_totals():
+    catalog = Catalog()
+    items = [item(1, 1, 2)]
+    catalog.rebuild(make_data([product(1, 5)], items))
+    changes = catalog.rebuild(make_data([product(1, 7)], items))
+    assert changes.shopping_lists == {1}
+    assert catalog.get_shopping_list_totals(1).total_price == 14
+
+
+def test_replace_shopping_list_item():
+    catalog = Catalog()
+    old = item(1, 1, 2)
+    catalog.rebuild(make_data([product(1, 5), product(2, 1)], [old]))
+    changes = catalog.replace_shopping_list_item(old, item(1, 1, 5))
+    assert changes.products == {1}
+    assert catalog.get_shopping_list_totals(1).total_price == 25
+    catalog.replace_shopping_list_item(None, item(-1, 2, 3))
+    assert catalog.get_shopping_list_totals(1).count == 2
+    catalog.replace_shopping_list_item(catalog.get_product_items(1)[0], None)
+    totals = catalog.get_shopping_list_totals(1)
+    assert (totals.count, totals.total_price) == (1, 3)
@@ -0,0 +1,20 @@
+'''Grocy objects query fallback'''
+
+from custom_components.grocy.grocy.grocy_api_client import apply_query
+
+ROWS = [{'id': '1', 'name': 'b', 'amount': '10'},
+        {'id': '2', 'name': 'a', 'amount': '9'},
+        {'id': '3', 'name': 'c', 'amount': '2'}]
+
+
+def test_order_without_limit():
+    assert [row['id'] for row in apply_query(ROWS, order='amount')] == ['3', '2', '1']
+    assert [row['id'] for row in apply_query(ROWS, order='name:desc')] == ['3', '1', '2']
+
+
+def test_order_with_limit():
+    assert [row['id'] for row in apply_query(ROWS, order='amount:desc', limit=2, offset=1)] == ['2', '3']
+
+
+def test_filter():
+    assert [row['id'] for row in apply_query(ROWS, ['amount>5', 'name~A'])] == ['2']
@@ -0,0 +1,97 @@
+'''Transport policy retries and circuit breaker'''
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+from custom_components.grocy.grocy.transport import TransportPolicy, CircuitBreaker, CircuitOpenError
+
+URL = 'http://grocy.local:9192/api/objects/products'
+
+
+class FlakyRequest:
+    '''Fails with the given errors, then returns 'ok' '''
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def http_error(status: int):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def make_policy(**kwargs):
+    return TransportPolicy(backoff_base=0, **dict({'retries': 2}, **kwargs))
+
+
+def test_retries_idempotent_requests():
+    request = FlakyRequest(requests.ConnectionError(), http_error(503))
+    assert make_policy().run('GET', URL, request) == 'ok'
+    assert request.calls == 3
+
+
+def test_gives_up_after_retries():
+    request = FlakyRequest(*[requests.Timeout()] * 3)
+    with pytest.raises(requests.Timeout):
+        make_policy().run('GET', URL, request)
+    assert request.calls == 3
+
+
+def test_client_errors_are_not_retried():
+    request = FlakyRequest(http_error(404))
+    with pytest.raises(requests.HTTPError):
+        make_policy().run('GET', URL, request)
+    assert request.calls == 1
+
+
+def test_post_is_not_retried():
+    request = FlakyRequest(requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        make_policy().run('POST', URL, request)
+    assert request.calls == 1
+
+
+def test_async_retries():
+    async def request():
+        return flaky()
+    flaky = FlakyRequest(requests.ConnectionError())
+    assert asyncio.run(make_policy().async_run('GET', URL, request)) == 'ok'
+    assert flaky.calls == 2
+
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(threshold=2, reset=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+    time.sleep(0.06)
+    # One request is let through, its result closes or reopens the breaker
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow()
+
+
+def test_open_breaker_refuses_requests():
+    policy = make_policy(retries=0, breaker_threshold=2)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            policy.run('GET', URL, FlakyRequest(requests.ConnectionError()))
+    request = FlakyRequest()
+    with pytest.raises(CircuitOpenError):
+        policy.run('GET', URL, request)
+    assert request.calls == 0
+    # Other hosts have their own breaker
+    assert policy.run('GET', 'http://other.local/api', request) == 'ok'
@@ -0,0 +1,82 @@
+'''Write queue coalescing'''
+
+import asyncio
+
+from unittest.mock import MagicMock
+
+from custom_components.grocy.write_queue import WriteQueue, shopping_list_op, userfield_op
+
+
+def make_queue():
+    return WriteQueue(MagicMock(), MagicMock())
+
+
+def amounts(queue):
+    return [op['amount'] for op in queue._ops]
+
+
+def test_add_then_subtract_is_merged():
+    queue = make_queue()
+    queue._enqueue(shopping_list_op(1, 1, 2))
+    queue._enqueue(shopping_list_op(1, 1, -1))
+    assert amounts(queue) == [1]
+    queue._enqueue(shopping_list_op(1, 1, -1))
+    assert len(queue) == 0
+
+
+def test_subtract_then_add_is_kept_in_order():
+    # Grocy stops at 0: subtracting a product that isn't listed and adding it leaves 1 on the list
+    queue = make_queue()
+    queue._enqueue(shopping_list_op(1, 1, -1))
+    queue._enqueue(shopping_list_op(1, 1, 1))
+    assert amounts(queue) == [-1, 1]
+    # Newer ops merge with the last queued one
+    queue._enqueue(shopping_list_op(1, 1, 2))
+    assert amounts(queue) == [-1, 3]
+
+
+def test_subtracts_are_merged():
+    queue = make_queue()
+    queue._enqueue(shopping_list_op(1, 1, -1))
+    queue._enqueue(shopping_list_op(1, 1, -2))
+    assert amounts(queue) == [-3]
+
+
+def test_requeue_keeps_subtract_before_add():
+    queue = make_queue()
+    queue._enqueue(shopping_list_op(1, 1, 1))
+    queue._requeue([shopping_list_op(1, 1, -1)])
+    assert amounts(queue) == [-1, 1]
+
+
+def test_userfield_last_write_wins():
+    queue = make_queue()
+    queue._enqueue(userfield_op('products', 1, 'price', 1))
+    queue._enqueue(userfield_op('products', 1, 'price', 2))
+    assert [op['value'] for op in queue._ops] == [2]
+
+
+class RecordingClient:
+    '''Records the grocy writes, subtracts are slower than adds'''
+
+    def __init__(self):
+        self.calls = []
+
+    async def add_product_to_shopping_list(self, product_id, shopping_list_id, amount):
+        self.calls.append(('add', product_id, amount))
+
+    async def remove_product_in_shopping_list(self, product_id, shopping_list_id, amount):
+        await asyncio.sleep(0.01)
+        self.calls.append(('remove', product_id, amount))
+
+
+def test_flush_keeps_unmerged_ops_in_order():
+    client = RecordingClient()
+    queue = WriteQueue(MagicMock(), client)
+    queue._enqueue(shopping_list_op(1, 1, -1))
+    queue._enqueue(shopping_list_op(2, 1, 1))
+    queue._enqueue(shopping_list_op(1, 1, 1))
+    assert asyncio.run(queue.async_flush())
+    # Product 2 is sent with the first batch, the add of product 1 waits for its subtract
+    assert client.calls == [('add', 2, 1), ('remove', 1, 1), ('add', 1, 1)]
+    assert len(queue) == 0